@@ -0,0 +1,319 @@
+import argparse
+import indexer
+import os
+import parso
+import shallow_indexer
+import sys
+import time
+import tracemalloc
+
+try:
+	import resource
+except ImportError: # not available on Windows
+	resource = None
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks for the SourcetrailPythonIndexer. None of the benchmarks writes to a Sourcetrail database.')
+
+	subparsers = parser.add_subparsers(title='benchmarks', dest='benchmark')
+
+	namesBenchmarkName = 'names'
+	parserNames = subparsers.add_parser(
+		namesBenchmarkName,
+		help='Index a Python source file in deep mode and report the number of indexed names per second.'
+	)
+	parserNames.add_argument('--source-file-path', help='path to the source file to index', type=str, required=True)
+	parserNames.add_argument(
+		'--environment-path',
+		help='path to the Python executable or the directory that contains the Python environment that should be used to resolve dependencies',
+		type=str,
+		required=False
+	)
+	parserNames.add_argument('--repeat', help='number of times the source file is indexed', type=int, default=1, required=False)
+	parserNames.add_argument('--hybrid', help='use the hybrid indexing mode', action='store_true', required=False)
+
+	nameHierarchyBenchmarkName = 'name-hierarchy'
+	parserNameHierarchy = subparsers.add_parser(
+		nameHierarchyBenchmarkName,
+		help='Measure the time spent on serializing, copying and displaying name hierarchies.'
+	)
+	parserNameHierarchy.add_argument('--depth', help='number of name elements of the measured name hierarchy', type=int, default=5, required=False)
+	parserNameHierarchy.add_argument('--iterations', help='number of times each operation is run', type=int, default=100000, required=False)
+
+	memoryBenchmarkName = 'memory'
+	parserMemory = subparsers.add_parser(
+		memoryBenchmarkName,
+		help='Index a Python source file and report the peak memory usage.'
+	)
+	parserMemory.add_argument('--source-file-path', help='path to the source file to index', type=str, required=True)
+	parserMemory.add_argument(
+		'--environment-path',
+		help='path to the Python executable or the directory that contains the Python environment that should be used to resolve dependencies',
+		type=str,
+		required=False
+	)
+	parserMemory.add_argument('--shallow', help='use the shallow indexing mode', action='store_true', required=False)
+
+	classifyBenchmarkName = 'classify'
+	parserClassify = subparsers.add_parser(
+		classifyBenchmarkName,
+		help='Compare classifying the names of a Python source file as calls and qualifiers one by one with classifying them in a single pass.'
+	)
+	parserClassify.add_argument('--source-file-path', help='path to the source file whose names are classified', type=str, required=True)
+	parserClassify.add_argument('--repeat', help='number of times the names are classified', type=int, default=5, required=False)
+
+	args = parser.parse_args()
+
+	if args.benchmark == namesBenchmarkName:
+		runNamesBenchmark(args)
+	elif args.benchmark == nameHierarchyBenchmarkName:
+		runNameHierarchyBenchmark(args)
+	elif args.benchmark == memoryBenchmarkName:
+		runMemoryBenchmark(args)
+	elif args.benchmark == classifyBenchmarkName:
+		runClassifyBenchmark(args)
+	else:
+		parser.print_help()
+		return 1
+	return 0
+
+
+def runNamesBenchmark(args):
+	workingDirectory = os.getcwd()
+
+	sourceFilePath = args.source_file_path
+	if not os.path.isabs(sourceFilePath):
+		sourceFilePath = os.path.join(workingDirectory, sourceFilePath)
+
+	with open(sourceFilePath, 'r', encoding='utf-8') as input:
+		nameCount = countNames(parso.parse(input.read()))
+
+	durations = []
+	for i in range(args.repeat):
+		startTime = time.perf_counter()
+		indexer.indexSourceFile(sourceFilePath, args.environment_path, workingDirectory, BenchmarkAstVisitorClient(), False, hybrid = args.hybrid)
+		durations.append(time.perf_counter() - startTime)
+
+	bestDuration = min(durations)
+	print('Indexed ' + str(nameCount) + ' names in ' + '{:.3f}'.format(bestDuration) + ' s (best of ' + str(args.repeat) + '): ' +
+		'{:.1f}'.format(nameCount / bestDuration) + ' names/s')
+	if args.hybrid:
+		print('Hybrid indexing: ' + indexer.getHybridStatisticsString())
+
+
+def runNameHierarchyBenchmark(args):
+	nameHierarchy = indexer.NameHierarchy(indexer.NameElement('package'), '.')
+	for i in range(1, args.depth):
+		nameHierarchy = nameHierarchy.copyAndAppend(indexer.NameElement('element' + str(i), '', '()'))
+	nameElement = indexer.NameElement('name')
+
+	# "serialize (uncached)" measures a hierarchy that has not been serialized before, which is what happens when a
+	# symbol is recorded for the first time.
+	operations = [
+		('copy', lambda: nameHierarchy.copy()),
+		('copyAndAppend', lambda: nameHierarchy.copyAndAppend(nameElement)),
+		('serialize (uncached)', lambda: nameHierarchy.copyAndAppend(nameElement).serialize()),
+		('serialize (cached)', lambda: nameHierarchy.serialize()),
+		('getDisplayString (uncached)', lambda: nameHierarchy.copyAndAppend(nameElement).getDisplayString()),
+		('getDisplayString (cached)', lambda: nameHierarchy.getDisplayString())
+	]
+
+	for operationName, operation in operations:
+		startTime = time.perf_counter()
+		for i in range(args.iterations):
+			operation()
+		duration = time.perf_counter() - startTime
+		print(operationName + ': ' + '{:.3f}'.format(duration * 1000000 / args.iterations) + ' us per call')
+
+
+def runMemoryBenchmark(args):
+	workingDirectory = os.getcwd()
+
+	sourceFilePath = args.source_file_path
+	if not os.path.isabs(sourceFilePath):
+		sourceFilePath = os.path.join(workingDirectory, sourceFilePath)
+
+	# Python allocations are traced separately, because the peak RSS also contains everything that has been loaded
+	# before indexing started.
+	tracemalloc.start()
+	if args.shallow:
+		shallow_indexer.indexSourceFile(sourceFilePath, args.environment_path, workingDirectory, BenchmarkAstVisitorClient(), False)
+	else:
+		indexer.indexSourceFile(sourceFilePath, args.environment_path, workingDirectory, BenchmarkAstVisitorClient(), False)
+	tracedPeakSize = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	print('Peak size of traced Python allocations: ' + '{:.1f}'.format(tracedPeakSize / (1024 * 1024)) + ' MiB')
+	if resource is not None:
+		# ru_maxrss is reported in bytes on macOS and in kilobytes everywhere else
+		maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform != 'darwin':
+			maxRss *= 1024
+		print('Peak RSS: ' + '{:.1f}'.format(maxRss / (1024 * 1024)) + ' MiB')
+
+
+def runClassifyBenchmark(args):
+	with open(args.source_file_path, 'r', encoding='utf-8') as input:
+		moduleNode = parso.parse(input.read())
+
+	nameNodes = []
+	leaf = moduleNode.get_first_leaf()
+	while leaf is not None:
+		if leaf.type == 'name':
+			nameNodes.append(leaf)
+		leaf = leaf.get_next_leaf()
+
+	def classifyByName():
+		for nameNode in nameNodes:
+			isCallNode(nameNode)
+			isQualifierNode(nameNode)
+
+	def classifyInSinglePass():
+		nameTagIndex = indexer.NameTagIndex(moduleNode)
+		for nameNode in nameNodes:
+			nameTagIndex.isCall(nameNode)
+			nameTagIndex.isQualifier(nameNode)
+
+	for description, classify in [('name by name', classifyByName), ('single pass', classifyInSinglePass)]:
+		durations = []
+		for i in range(args.repeat):
+			startTime = time.perf_counter()
+			classify()
+			durations.append(time.perf_counter() - startTime)
+		bestDuration = min(durations)
+		print('Classified ' + str(len(nameNodes)) + ' names ' + description + ' in ' + '{:.3f}'.format(bestDuration) + ' s (best of ' + str(args.repeat) + ')')
+
+
+# The classification of single names that the indexer used before names were classified in a single pass. It is kept
+# as the reference for the "classify" benchmark.
+
+def isQualifierNode(node):
+	nextNode = getNext(node)
+	if nextNode is not None and nextNode.type == 'trailer':
+		nextNode = getNext(nextNode)
+	if nextNode is not None and nextNode.type == 'operator' and nextNode.value == '.':
+		return True
+	return False
+
+
+def isCallNode(node):
+	nextNode = getNext(node)
+	if nextNode is not None and nextNode.type == 'trailer':
+		if len(nextNode.children) >= 2 and nextNode.children[0].value == '(' and nextNode.children[-1].value == ')':
+			return True
+	return False
+
+
+def getNext(node):
+	if hasattr(node, 'children'):
+		for c in node.children:
+			return c
+
+	siblingSource = node
+	while siblingSource is not None and siblingSource.parent is not None:
+		sibling = siblingSource.get_next_sibling()
+		if sibling is not None:
+			return sibling
+		siblingSource = siblingSource.parent
+
+	return None
+
+
+def countNames(node):
+	count = 0
+	nodesToVisit = [node]
+	while nodesToVisit:
+		currentNode = nodesToVisit.pop()
+		if currentNode.type == 'name':
+			count += 1
+		if hasattr(currentNode, 'children'):
+			nodesToVisit.extend(currentNode.children)
+	return count
+
+
+class BenchmarkAstVisitorClient:
+	# Client that hands out ids like the database would but does not store anything, so the benchmarks only
+	# measure the time spent in the indexer itself.
+
+	def __init__(self):
+		self.nextElementId = 1
+
+
+	def getNextElementId(self):
+		id = self.nextElementId
+		self.nextElementId += 1
+		return id
+
+
+	def recordSymbol(self, nameHierarchy):
+		nameHierarchy.serialize()
+		return self.getNextElementId()
+
+
+	def recordSymbolDefinitionKind(self, symbolId, symbolDefinitionKind):
+		pass
+
+
+	def recordSymbolKind(self, symbolId, symbolKind):
+		pass
+
+
+	def recordSymbolLocation(self, symbolId, sourceRange):
+		pass
+
+
+	def recordSymbolScopeLocation(self, symbolId, sourceRange):
+		pass
+
+
+	def recordSymbolSignatureLocation(self, symbolId, sourceRange):
+		pass
+
+
+	def recordReference(self, contextSymbolId, referencedSymbolId, referenceKind):
+		return self.getNextElementId()
+
+
+	def recordReferenceLocation(self, referenceId, sourceRange):
+		pass
+
+
+	def recordReferenceIsAmbiguous(self, referenceId):
+		pass
+
+
+	def recordReferenceToUnsolvedSymhol(self, contextSymbolId, referenceKind, sourceRange):
+		return self.getNextElementId()
+
+
+	def recordQualifierLocation(self, referencedSymbolId, sourceRange):
+		pass
+
+
+	def recordFile(self, filePath):
+		return self.getNextElementId()
+
+
+	def recordFileLanguage(self, fileId, languageIdentifier):
+		pass
+
+
+	def recordLocalSymbol(self, name):
+		return self.getNextElementId()
+
+
+	def recordLocalSymbolLocation(self, localSymbolId, sourceRange):
+		pass
+
+
+	def recordAtomicSourceRange(self, sourceRange):
+		pass
+
+
+	def recordError(self, message, fatal, sourceRange):
+		pass
+
+
+if __name__ == '__main__':
+	main()
@@ -1,12 +1,17 @@
 import codecs
+import collections
+import hashlib
 import jedi
 import json
 import os
+import parso
+import signal
 import sys
+import threading
+import time
 
 import sourcetraildb as srctrl
 
-from jedi.inference import InferenceState
 from jedi.api import helpers
 from jedi.inference.gradual.conversion import convert_names
 from jedi.api import classes
@@ -16,6 +21,13 @@ from _version import _sourcetrail_db_version
 
 
 _virtualFilePath = 'virtual_file.py'
+_defaultDefinitionCacheSize = 100000
+_cacheDirectoryPath = os.path.join(jedi.settings.cache_directory, 'SourcetrailPythonIndexer')
+_environmentCacheFilePath = os.path.join(_cacheDirectoryPath, 'environments.json')
+_usedParseCacheFilePaths = set()
+_builtinsIndices = {}
+_moduleFileExtensions = ['.py', '.pyi', '.pyc', '.pyd', '.so']
+_encodeJsonString = json.encoder.encode_basestring_ascii # the string encoder that json.dumps uses with its default settings
 
 
 class SourcetrailScript(jedi.Script):
@@ -24,8 +36,17 @@ class SourcetrailScript(jedi.Script):
 				_project=None):
 		jedi.Script.__init__(self, source, line, column, path, encoding, sys_path, environment, _project)
 
+	def resetInferenceLimits(self):
+		# The Script is reused for all names of a file, but jedi's limits on inference are meant for a single request.
+		# Without resetting them before each inference, the names at the end of a file would not be resolved anymore
+		# once these limits have been reached by the names before.
+		self._inference_state.inferred_element_counts = {}
+		self._inference_state.reset_recursion_limitations()
+
 	def _goto(self, line, column, follow_imports=False, follow_builtin_imports=False,
 				only_stubs=False, prefer_stubs=False, follow_override=False):
+		self.resetInferenceLimits()
+
 		if follow_override:
 			return super()._goto(line, column, follow_imports=follow_imports, follow_builtin_imports=follow_builtin_imports, only_stubs=only_stubs, prefer_stubs=prefer_stubs)
 		tree_name = self._module_node.get_name_of_position((line, column))
@@ -66,6 +87,23 @@ def isValidEnvironment(environmentPath):
 
 
 def getEnvironment(environmentPath = None):
+	# Creating an environment requires starting the Python interpreter of that environment in a subprocess, which is
+	# slow. So we keep the information that we need about known environments in a cache file and only start the
+	# subprocess once jedi actually needs to access the interpreter.
+	executablePath = getExecutablePathOfEnvironment(environmentPath)
+	if executablePath is not None:
+		environment = loadEnvironmentFromCache(executablePath)
+		if environment is not None:
+			return environment
+
+	environment = createEnvironment(environmentPath)
+
+	if executablePath is not None and os.path.normcase(environment._start_executable) == os.path.normcase(executablePath):
+		storeEnvironmentInCache(executablePath, environment)
+	return environment
+
+
+def createEnvironment(environmentPath = None):
 	if environmentPath is not None:
 		try:
 			environment = jedi.create_environment(environmentPath, False)
@@ -106,6 +144,331 @@ def getEnvironment(environmentPath = None):
 	raise jedi.InvalidPythonEnvironment("Unable to find an executable Python environment.")
 
 
+def getExecutablePathOfEnvironment(environmentPath):
+	# Returns the path to the executable that would be used for the environment or None if this cannot be determined
+	# without starting an interpreter.
+	if environmentPath is None:
+		for variableName in ['VIRTUAL_ENV', 'CONDA_PREFIX']:
+			if os.environ.get(variableName):
+				environmentPath = os.environ.get(variableName)
+				break
+		else:
+			if not os.path.basename(sys.executable).lower().startswith('python'):
+				return None
+			return os.path.abspath(sys.executable)
+
+	if os.path.isfile(environmentPath):
+		return os.path.abspath(environmentPath)
+
+	if os.name == 'nt':
+		candidatePaths = [os.path.join(environmentPath, 'Scripts', 'python.exe'), os.path.join(environmentPath, 'python.exe')]
+	else:
+		candidatePaths = [os.path.join(environmentPath, 'bin', 'python')]
+	for candidatePath in candidatePaths:
+		if os.path.isfile(candidatePath):
+			return os.path.abspath(candidatePath)
+	return None
+
+
+class CachedEnvironment(jedi.api.environment.Environment):
+	# In contrast to jedi's Environment, this one is created from cached information and does not start a subprocess
+	# on construction. The subprocess is started lazily, once jedi needs to inspect compiled modules.
+
+	def __init__(self, executablePath, cacheEntry):
+		self._start_executable = executablePath
+		self._env_vars = None
+		self.executable = cacheEntry['executable']
+		self.path = cacheEntry['path']
+		self.version_info = jedi.api.environment._VersionInfo(*cacheEntry['version_info'])
+		self.sysPath = cacheEntry['sys_path']
+
+
+	def get_sys_path(self):
+		return list(self.sysPath)
+
+
+def getEnvironmentCacheVersion():
+	return __version__ + '/jedi-' + jedi.__version__
+
+
+def getFileFingerprint(path):
+	try:
+		stat = os.stat(path)
+		return [stat.st_mtime, stat.st_size]
+	except OSError:
+		return None
+
+
+def isModulePath(pathWithoutExtension):
+	# Returns whether a module file (of any kind) or a package exists at the given path.
+	if os.path.isdir(pathWithoutExtension):
+		return True
+	(directoryPath, moduleName) = os.path.split(pathWithoutExtension)
+	try:
+		fileNames = os.listdir(directoryPath)
+	except OSError:
+		return False
+	for fileName in fileNames:
+		(name, extension) = os.path.splitext(fileName)
+		if extension in ['.pyd', '.so']:
+			name = name.split('.')[0] # extension modules may carry an ABI tag, e.g. "foo.cpython-38-x86_64-linux-gnu.so"
+		if name == moduleName and extension in _moduleFileExtensions:
+			return True
+	return False
+
+
+def getEnvironmentFingerprint(executablePath, sysPath):
+	# Installing packages may add sys.path entries via ".pth" files, which changes the modification time of the
+	# directories on the existing sys.path. So comparing the fingerprints of these directories is sufficient.
+	return {
+		'executable': getFileFingerprint(executablePath),
+		'python_path_variable': os.environ.get('PYTHONPATH'),
+		'sys_path': [getFileFingerprint(p) for p in sysPath]
+	}
+
+
+def loadEnvironmentCache():
+	try:
+		with open(_environmentCacheFilePath, 'r', encoding='utf-8') as input:
+			cache = json.load(input)
+		if cache.get('version') == getEnvironmentCacheVersion():
+			return cache
+	except Exception:
+		pass
+	return { 'version': getEnvironmentCacheVersion(), 'environments': {} }
+
+
+def loadEnvironmentFromCache(executablePath):
+	cacheEntry = loadEnvironmentCache()['environments'].get(executablePath)
+	if cacheEntry is None:
+		return None
+	if cacheEntry['fingerprint'] != getEnvironmentFingerprint(executablePath, cacheEntry['sys_path']):
+		return None
+	return CachedEnvironment(executablePath, cacheEntry)
+
+
+def storeEnvironmentInCache(executablePath, environment):
+	try:
+		sysPath = environment.get_sys_path()
+		cache = loadEnvironmentCache()
+		cache['environments'][executablePath] = {
+			'executable': environment.executable,
+			'path': environment.path,
+			'version_info': list(environment.version_info),
+			'sys_path': sysPath,
+			'fingerprint': getEnvironmentFingerprint(executablePath, sysPath)
+		}
+		writeJsonFileAtomically(_environmentCacheFilePath, cache)
+	except Exception as e:
+		print('WARNING: Unable to store Python environment in cache (details: "' + str(e) + '").')
+
+
+def writeJsonFileAtomically(filePath, data):
+	# other indexer processes may read the file at the same time, so they must never see a partially written file
+	directoryPath = os.path.dirname(filePath)
+	if directoryPath and not os.path.exists(directoryPath):
+		os.makedirs(directoryPath, exist_ok=True)
+	temporaryFilePath = filePath + '.' + str(os.getpid()) + '.tmp'
+	with open(temporaryFilePath, 'w', encoding='utf-8') as output:
+		json.dump(data, output)
+	os.replace(temporaryFilePath, filePath)
+
+
+def configureParseCache(cacheDirectoryPath):
+	# jedi tells parso to store the syntax trees of imported modules in its cache directory, so later runs and other
+	# processes do not need to parse them again. parso names these files after the path of the module and the version of
+	# Python, and ignores them once the module has been modified. The version of parso is added here, because the files
+	# are pickled parso objects.
+	jedi.settings.cache_directory = os.path.join(os.path.abspath(cacheDirectoryPath), 'parso-' + parso.__version__)
+
+
+def getParseCacheDirectoryPath():
+	return parso.cache._get_cache_directory_path(cache_path=jedi.settings.cache_directory)
+
+
+def resetUsedParseCacheFiles():
+	# The cache files that have been marked as used are only skipped within a single run or request. A process that
+	# handles several of them (e.g. serve) needs to mark the files again, otherwise they would look unused to the
+	# pruning of later runs.
+	_usedParseCacheFilePaths.clear()
+
+
+def markUsedParseCacheFiles():
+	# The access time of a cache file is used to find the files that have not been used for the longest time, but it is
+	# not updated on read by many file systems. parso only compares the modification time to the module file, which is
+	# why the access time can be set without invalidating the file.
+	for hashedGrammar, items in parso.cache.parser_cache.items():
+		for modulePath in items:
+			if modulePath is None:
+				continue
+			cacheFilePath = parso.cache._get_hashed_path(hashedGrammar, modulePath, cache_path=jedi.settings.cache_directory)
+			if cacheFilePath in _usedParseCacheFilePaths:
+				continue
+			try:
+				os.utime(cacheFilePath, (time.time(), os.stat(cacheFilePath).st_mtime))
+				_usedParseCacheFilePaths.add(cacheFilePath)
+			except OSError:
+				pass # the module has not been stored in the cache
+
+
+def pruneParseCache(maxSize, isVerbose = False):
+	# removes the least recently used cache files until their total size in bytes does not exceed "maxSize"
+	cacheDirectoryPath = getParseCacheDirectoryPath()
+	cacheFiles = []
+	for fileName in os.listdir(cacheDirectoryPath):
+		if not fileName.endswith('.pkl'):
+			continue
+		cacheFilePath = os.path.join(cacheDirectoryPath, fileName)
+		try:
+			stat = os.stat(cacheFilePath)
+		except OSError:
+			continue
+		cacheFiles.append((max(stat.st_atime, stat.st_mtime), stat.st_size, cacheFilePath))
+	cacheFiles.sort(reverse=True)
+
+	totalSize = 0
+	removedFileCount = 0
+	for lastUsedTime, size, cacheFilePath in cacheFiles:
+		totalSize += size
+		if totalSize <= maxSize:
+			continue
+		try:
+			os.remove(cacheFilePath)
+			removedFileCount += 1
+		except OSError as e:
+			print('WARNING: Unable to remove parse cache file "' + cacheFilePath + '" (details: "' + str(e) + '").')
+		_usedParseCacheFilePaths.discard(cacheFilePath)
+
+	if isVerbose:
+		print('INFO: Removed ' + str(removedFileCount) + ' of ' + str(len(cacheFiles)) + ' files from the parse cache in "' + cacheDirectoryPath + '".')
+	return removedFileCount
+
+
+def loadImportCache(filePath):
+	try:
+		with open(filePath, 'r', encoding='utf-8') as input:
+			data = json.load(input)
+		if data.get('version') != getEnvironmentCacheVersion():
+			return
+		_importCache.addSerializedEntries(data['entries'])
+	except Exception:
+		pass
+
+
+def storeImportCache(filePath):
+	try:
+		writeJsonFileAtomically(filePath, { 'version': getEnvironmentCacheVersion(), 'entries': _importCache.getSerializedEntries() })
+	except Exception as e:
+		print('WARNING: Unable to store import cache file "' + filePath + '" (details: "' + str(e) + '").')
+
+
+def takeNewImportCacheEntries():
+	return _importCache.takeNewSerializedEntries()
+
+
+def addImportCacheEntries(serializedEntries):
+	_importCache.addSerializedEntries(serializedEntries)
+
+
+def getImportCacheStatisticsString():
+	return _importCache.getStatisticsString()
+
+
+def takeHybridStatistics():
+	statistics = (_hybridStatistics.localNameCount, _hybridStatistics.inferredNameCount)
+	_hybridStatistics.localNameCount = 0
+	_hybridStatistics.inferredNameCount = 0
+	return statistics
+
+
+def addHybridStatistics(statistics):
+	(localNameCount, inferredNameCount) = statistics
+	_hybridStatistics.localNameCount += localNameCount
+	_hybridStatistics.inferredNameCount += inferredNameCount
+
+
+def getHybridStatisticsString():
+	return _hybridStatistics.getStatisticsString()
+
+
+def getBuiltinsIndex(environment, nameInferenceBudget = None):
+	# Maps the names of builtin classes and functions to what they resolve to in jedi's typeshed stubs. Resolving them
+	# with jedi requires inferring their definitions within the stubs for every indexed file, so the index is created
+	# once per Python version and stored next to the environment cache.
+	versionString = '.'.join(str(i) for i in environment.version_info[:2])
+	builtinsIndex = _builtinsIndices.get(versionString)
+	if builtinsIndex is None:
+		builtinsIndexFilePath = os.path.join(_cacheDirectoryPath, 'builtins-' + versionString + '.json')
+		builtinsIndex = loadBuiltinsIndex(builtinsIndexFilePath)
+		if builtinsIndex is None:
+			builtinsIndex, isComplete = createBuiltinsIndex(environment, nameInferenceBudget)
+			if not isComplete:
+				return builtinsIndex # an index that misses names is created again for the next file
+			storeBuiltinsIndex(builtinsIndexFilePath, builtinsIndex)
+		_builtinsIndices[versionString] = builtinsIndex
+	return builtinsIndex
+
+
+def createBuiltinsIndex(environment, nameInferenceBudget = None):
+	# Returns the index and whether it is complete. Each name is resolved within the inference time budget of a single
+	# name, names that exceed it are left out of the index.
+
+	# The code is not parsed as a virtual file, because parso would reuse the syntax tree of the virtual file that may be
+	# indexed at the same time.
+	sourceFilePath = os.path.join(_cacheDirectoryPath, 'builtins.py')
+
+	names = set()
+	script = SourcetrailScript(source = '', path = sourceFilePath, environment = environment)
+	try:
+		completions = InferenceBudget(nameInferenceBudget, None).call(lambda: script.complete(1, 0))
+	except InferenceTimeout:
+		print('WARNING: Listing the builtin names exceeded the inference time budget. Builtin names are resolved without the builtins index.')
+		return {}, False
+	for completion in completions:
+		if completion.module_name in ['builtins', '__builtin__'] and completion.type != 'keyword':
+			names.add(completion.name)
+	sourceCode = '\n'.join(sorted(names)) + '\n'
+
+	# the names are resolved the same way they are resolved when a file is indexed
+	astVisitor = AstVisitor(RecordingAstVisitorClient(), environment, sourceFilePath, sourceCode, nameInferenceBudget = nameInferenceBudget)
+
+	builtinsIndex = {}
+	for nameNodes in astVisitor.getModuleNode().get_used_names().values():
+		nameNode = nameNodes[0]
+		definitions = astVisitor.getDefinitionsOfNode(nameNode, sourceFilePath)
+		if len(definitions) != 1 or definitions[0].type not in ['class', 'function']:
+			continue
+		nameHierarchy = astVisitor.getNameHierarchyOfClassOrFunctionDefinition(definitions[0])
+		if nameHierarchy is None:
+			continue
+		builtinsIndex[nameNode.value] = (definitions[0].type, nameHierarchy, definitions[0].module_path)
+	return builtinsIndex, astVisitor.inferenceBudget.timeoutCount == 0
+
+
+def loadBuiltinsIndex(filePath):
+	try:
+		with open(filePath, 'r', encoding='utf-8') as input:
+			data = json.load(input)
+		if data.get('version') != getEnvironmentCacheVersion() or data.get('jedi_path') != os.path.dirname(jedi.__file__):
+			return None
+		builtinsIndex = {}
+		for name, (definitionType, names, modulePath) in data['names'].items():
+			builtinsIndex[name] = (definitionType, getNameHierarchyFromNames(names, '.'), modulePath)
+		return builtinsIndex
+	except Exception:
+		return None
+
+
+def storeBuiltinsIndex(filePath, builtinsIndex):
+	try:
+		names = {}
+		for name, (definitionType, nameHierarchy, modulePath) in builtinsIndex.items():
+			names[name] = [definitionType, [e.name for e in nameHierarchy.nameElements], modulePath]
+		writeJsonFileAtomically(filePath, { 'version': getEnvironmentCacheVersion(), 'jedi_path': os.path.dirname(jedi.__file__), 'names': names })
+	except Exception as e:
+		print('WARNING: Unable to store builtins index file "' + filePath + '" (details: "' + str(e) + '").')
+
+
 def isSourcetrailDBVersionCompatible(allowLogging = False):
 	requiredVersion = _sourcetrail_db_version
 
@@ -123,35 +486,35 @@ def isSourcetrailDBVersionCompatible(allowLogging = False):
 	return True
 
 
-def indexSourceCode(sourceCode, workingDirectory, astVisitorClient, isVerbose, environmentPath = None, sysPath = None):
+def indexSourceCode(sourceCode, workingDirectory, astVisitorClient, isVerbose, environmentPath = None, sysPath = None, definitionCacheSize = _defaultDefinitionCacheSize, nameInferenceBudget = None, fileInferenceBudget = None, hybrid = False):
 	sourceFilePath = _virtualFilePath
 
 	environment = getEnvironment(environmentPath)
 
 	project = jedi.api.project.Project(workingDirectory, environment_path = environment.path)
 
-	evaluator = InferenceState(
-		project,
-		environment=environment,
-		script_path=workingDirectory
-	)
-
-	module_node = evaluator.parse(
-		code=sourceCode,
-		path=workingDirectory,
-		cache=False,
-		diff_cache=False
-	)
-
 	if (isVerbose):
-		astVisitor = VerboseAstVisitor(astVisitorClient, evaluator, sourceFilePath, sourceCode, sysPath)
+		astVisitor = VerboseAstVisitor(
+			astVisitorClient, environment, sourceFilePath, sourceCode, sysPath, definitionCacheSize, nameInferenceBudget, fileInferenceBudget, hybrid,
+			project
+		)
 	else:
-		astVisitor = AstVisitor(astVisitorClient, evaluator, sourceFilePath, sourceCode, sysPath)
+		astVisitor = AstVisitor(
+			astVisitorClient, environment, sourceFilePath, sourceCode, sysPath, definitionCacheSize, nameInferenceBudget, fileInferenceBudget, hybrid,
+			project
+		)
+
+	astVisitor.traverseNode(astVisitor.getModuleNode())
+	_hybridStatistics.add(astVisitor.hybridStatistics)
 
-	astVisitor.traverseNode(module_node)
+	if isVerbose:
+		astVisitor.printCacheStatistics()
 
 
-def indexSourceFile(sourceFilePath, environmentPath, workingDirectory, astVisitorClient, isVerbose):
+def indexSourceFile(sourceFilePath, environmentPath, workingDirectory, astVisitorClient, isVerbose, definitionCacheSize = _defaultDefinitionCacheSize, environment = None, project = None, nameInferenceBudget = None, fileInferenceBudget = None, hybrid = False):
+	# "environment" and "project" may be provided by callers that index multiple files, so these objects only need to be
+	# created once. Returns the paths of the modules that the indexed data depends on and the paths (without extension)
+	# at which an added module would resolve one of the imports that could not be resolved.
 
 	if isVerbose:
 		print('INFO: Indexing source file "' + sourceFilePath + '".')
@@ -165,35 +528,37 @@ def indexSourceFile(sourceFilePath, environmentPath, workingDirectory, astVisito
 		with codecs.open(sourceFilePath, 'r') as input:
 			sourceCode=input.read()
 
-	environment = getEnvironment(environmentPath)
+	if environment is None:
+		environment = getEnvironment(environmentPath)
 
 	if isVerbose:
 		print('INFO: Using Python environment at "' + environment.path + '" for indexing.')
 
-	project = jedi.api.project.Project(workingDirectory, environment_path = environment.path)
-
-	evaluator = InferenceState(
-		project,
-		environment=environment,
-		script_path=workingDirectory
-	)
-
-	module_node = evaluator.parse(
-		code=sourceCode,
-		path=workingDirectory,
-		cache=False,
-		diff_cache=False
-	)
+	if project is None:
+		project = jedi.api.project.Project(workingDirectory, environment_path = environment.path)
 
 	if (isVerbose):
-		astVisitor = VerboseAstVisitor(astVisitorClient, evaluator, sourceFilePath)
+		astVisitor = VerboseAstVisitor(
+			astVisitorClient, environment, sourceFilePath, sourceCode, definitionCacheSize = definitionCacheSize,
+			nameInferenceBudget = nameInferenceBudget, fileInferenceBudget = fileInferenceBudget, hybrid = hybrid, project = project
+		)
 	else:
-		astVisitor = AstVisitor(astVisitorClient, evaluator, sourceFilePath)
+		astVisitor = AstVisitor(
+			astVisitorClient, environment, sourceFilePath, sourceCode, definitionCacheSize = definitionCacheSize,
+			nameInferenceBudget = nameInferenceBudget, fileInferenceBudget = fileInferenceBudget, hybrid = hybrid, project = project
+		)
+
+	astVisitor.traverseNode(astVisitor.getModuleNode())
+	_hybridStatistics.add(astVisitor.hybridStatistics)
 
-	astVisitor.traverseNode(module_node)
+	if isVerbose:
+		astVisitor.printCacheStatistics()
+
+	return (astVisitor.getReferencedModulePaths(), astVisitor.getUnresolvedImportPaths())
 
 
 class ContextInfo:
+	__slots__ = ('id', 'name', 'node')
 
 	def __init__(self, id, name, node):
 		self.id = id
@@ -201,12 +566,218 @@ class ContextInfo:
 		self.node = node
 
 
+class LruCache:
+
+	def __init__(self, maxSize):
+		self.maxSize = maxSize
+		self.entries = collections.OrderedDict()
+		self.hitCount = 0
+		self.missCount = 0
+
+
+	def contains(self, key):
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			self.hitCount += 1
+			return True
+		self.missCount += 1
+		return False
+
+
+	def get(self, key):
+		return self.entries[key]
+
+
+	def put(self, key, value):
+		self.entries[key] = value
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.maxSize:
+			self.entries.popitem(last=False)
+
+
+	def getStatisticsString(self):
+		return str(self.hitCount) + ' hits, ' + str(self.missCount) + ' misses, ' + str(len(self.entries)) + ' entries'
+
+
+class InferenceTimeout(BaseException):
+	# derived from BaseException, so it is not caught by the "except Exception" clauses within jedi
+	pass
+
+
+class InferenceBudget:
+	# Limits the time that jedi spends on inferring the definition of a single name and on all names of a file (in
+	# seconds). Inferring a single name is interrupted by a timer signal, which is only available on Unix and only in
+	# the main thread. Elsewhere (e.g. on Windows) the time limit of a single name is not enforced and only the time
+	# limit of the file applies. Once the time limit of the file has been used up, no more names are inferred.
+
+	_repeatInterval = 0.01 # the signal is repeated until the interruption can take place
+	_deferringModuleNames = [
+		'jedi.inference.compiled.subprocess', # interrupting would leave an unread answer of jedi's subprocess in the pipe
+		'parso.cache', # interrupting would leave a truncated pickle file in the parse cache
+		'weakref', '_weakrefset' # exceptions raised by callbacks are ignored
+	]
+	_isNameTimeLimitIgnoredReported = False
+
+	def __init__(self, nameTimeLimit, fileTimeLimit):
+		self.nameTimeLimit = nameTimeLimit
+		self.fileTimeLimit = fileTimeLimit
+		self.usedTime = 0.0
+		self.timeoutCount = 0
+		self.isUsedUpReported = False
+		self.isInferring = False
+		self.canInterrupt = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+	def isUsedUp(self):
+		return self.fileTimeLimit is not None and self.usedTime >= self.fileTimeLimit
+
+
+	def call(self, function):
+		timeLimit = self.nameTimeLimit
+		if self.fileTimeLimit is not None:
+			remainingTime = self.fileTimeLimit - self.usedTime
+			timeLimit = remainingTime if timeLimit is None else min(timeLimit, remainingTime)
+
+		if self.nameTimeLimit is not None and not self.canInterrupt and not InferenceBudget._isNameTimeLimitIgnoredReported:
+			InferenceBudget._isNameTimeLimitIgnoredReported = True
+			print('WARNING: The time spent on resolving a single name cannot be limited on this platform or outside of the main thread, '
+				'the name inference budget is ignored.')
+
+		startTime = time.time()
+		if timeLimit is None or not self.canInterrupt:
+			try:
+				return function()
+			finally:
+				self.usedTime += time.time() - startTime
+
+		previousHandler = signal.signal(signal.SIGALRM, self.handleTimerSignal)
+		try:
+			self.isInferring = True
+			signal.setitimer(signal.ITIMER_REAL, max(timeLimit, 0.000001), InferenceBudget._repeatInterval)
+			return function()
+		except InferenceTimeout:
+			self.timeoutCount += 1
+			raise
+		finally:
+			self.isInferring = False
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			signal.signal(signal.SIGALRM, previousHandler)
+			self.usedTime += time.time() - startTime
+
+
+	def handleTimerSignal(self, signalNumber, frame):
+		if not self.isInferring:
+			return
+		while frame is not None:
+			if frame.f_code.co_name == '__del__' or frame.f_globals.get('__name__') in InferenceBudget._deferringModuleNames:
+				return
+			frame = frame.f_back
+		raise InferenceTimeout()
+
+
+class ImportCache:
+	# Maps the module names of import statements to the modules they resolve to, so imports like "import os" do not
+	# need to be resolved by jedi again for every indexed file. Since the result depends on the environment, on the
+	# sys.path and on the location of the importing file, all of these are part of the key. The directories on the
+	# sys.path are fingerprinted by their modification time, which changes whenever a module or package is added to or
+	# removed from them.
+
+	def __init__(self):
+		self.entries = {}
+		self.newEntries = {}
+		self.hitCount = 0
+		self.missCount = 0
+
+
+	def get(self, key):
+		modules = self.entries.get(key)
+		if modules is not None:
+			for modulePath, nameHierarchy in modules:
+				if modulePath is not None and not os.path.isfile(modulePath):
+					modules = None
+					break
+		if modules is None:
+			self.missCount += 1
+		else:
+			self.hitCount += 1
+		return modules
+
+
+	def put(self, key, modules):
+		self.entries[key] = modules
+		self.newEntries[key] = modules
+
+
+	def getSerializedEntries(self):
+		return [ImportCache.serializeEntry(key, modules) for key, modules in self.entries.items()]
+
+
+	def takeNewSerializedEntries(self):
+		serializedEntries = [ImportCache.serializeEntry(key, modules) for key, modules in self.newEntries.items()]
+		self.newEntries = {}
+		return serializedEntries
+
+
+	def addSerializedEntries(self, serializedEntries):
+		for serializedKey, serializedModules in serializedEntries:
+			if len(serializedModules) == 0:
+				continue # an unresolved import that was stored by an earlier run, it may be resolved by now
+			modules = []
+			for modulePath, names in serializedModules:
+				modules.append((modulePath, getNameHierarchyFromNames(names, '.') if names is not None else None))
+			self.entries[tuple(serializedKey)] = modules
+
+
+	def getStatisticsString(self):
+		return str(self.hitCount) + ' hits, ' + str(self.missCount) + ' misses, ' + str(len(self.entries)) + ' entries'
+
+
+	@staticmethod
+	def serializeEntry(key, modules):
+		serializedModules = []
+		for modulePath, nameHierarchy in modules:
+			names = [e.name for e in nameHierarchy.nameElements] if nameHierarchy is not None else None
+			serializedModules.append([modulePath, names])
+		return [list(key), serializedModules]
+
+
+_importCache = ImportCache()
+
+
+class HybridStatistics:
+	# Counts the names that have been settled locally in hybrid mode and the names that needed deep inference.
+
+	def __init__(self):
+		self.localNameCount = 0
+		self.inferredNameCount = 0
+
+
+	def add(self, other):
+		self.localNameCount += other.localNameCount
+		self.inferredNameCount += other.inferredNameCount
+
+
+	def getStatisticsString(self):
+		nameCount = self.localNameCount + self.inferredNameCount
+		percentage = 100.0 * self.inferredNameCount / nameCount if nameCount > 0 else 0.0
+		return (
+			str(self.inferredNameCount) + ' of ' + str(nameCount) + ' names (' + '{:.1f}'.format(percentage) + '%) needed deep inference'
+		)
+
+
+_hybridStatistics = HybridStatistics()
+
+
 class AstVisitor:
 
-	def __init__(self, client, evaluator, sourceFilePath, sourceFileContent = None, sysPath = None):
+	def __init__(
+		self, client, environment, sourceFilePath, sourceFileContent = None, sysPath = None, definitionCacheSize = _defaultDefinitionCacheSize,
+		nameInferenceBudget = None, fileInferenceBudget = None, hybrid = False, project = None
+	):
 
 		self.client = client
-		self.environment = evaluator.environment
+		self.environment = environment
+		self.project = project # if not provided, jedi looks for the project of each file that is opened
 
 		self.sourceFilePath = sourceFilePath
 		if sourceFilePath != _virtualFilePath:
@@ -223,13 +794,32 @@ class AstVisitor:
 		if sysPath is not None:
 			self.sysPath.extend(sysPath)
 		else:
-			baseSysPath = evaluator.environment.get_sys_path()
+			baseSysPath = self.environment.get_sys_path()
 			baseSysPath.sort(reverse=True)
 			self.sysPath.extend(baseSysPath)
 		self.sysPath = list(filter(None, self.sysPath))
+		self.modulePathIndex = ModulePathIndex(getTypeshedPaths(self.environment.version_info) + self.sysPath)
+		self.moduleNameHierarchyCache = {}
 
 		self.contextStack = []
-		
+		self.scopeIndex = ScopeIndex()
+		self.nameTagIndex = NameTagIndex(None)
+		self.localNameIndex = LocalNameIndex() if hybrid else None # names are only settled locally in hybrid mode
+		self.hybridStatistics = HybridStatistics()
+		self.scriptCache = {}
+		self.definitionCache = LruCache(definitionCacheSize)
+		self.inferenceBudget = InferenceBudget(nameInferenceBudget, fileInferenceBudget)
+		self.nameHierarchyCache = {}
+		self.importTable = {}
+		self.importedModuleTable = {}
+		self.baseClassTable = {}
+		self.memberTable = {}
+		self.builtinsIndex = None
+		self.shadowedBuiltinNames = {}
+		self.importCacheKeyPrefix = self.getImportCacheKeyPrefix()
+		self.referencedModulePaths = set()
+		self.unresolvedImportPaths = set()
+
 		fileId = self.client.recordFile(self.sourceFilePath)
 		if fileId == 0:
 			print('ERROR: ' + srctrl.getLastError())
@@ -244,43 +834,31 @@ class AstVisitor:
 			self.contextStack.append(ContextInfo(moduleId, moduleNameHierarchy.getDisplayString(), None))
 
 
-	def traverseNode(self, node):
-		if node is None:
-			return
-
-		if node.type == 'classdef':
-			self.beginVisitClassdef(node)
-		elif node.type == 'funcdef':
-			self.beginVisitFuncdef(node)
-		if node.type == 'import_from':
-			self.beginVisitImportFrom(node)
-		if node.type == 'import_name':
-			self.beginVisitImportName(node)
-		elif node.type == 'name':
-			self.beginVisitName(node)
-		elif node.type == 'string':
-			self.beginVisitString(node)
-		elif node.type == 'error_leaf':
-			self.beginVisitErrorLeaf(node)
-
-		if hasattr(node, 'children'):
-			for c in node.children:
-				self.traverseNode(c)
-
-		if node.type == 'classdef':
-			self.endVisitClassdef(node)
-		elif node.type == 'funcdef':
-			self.endVisitFuncdef(node)
-		if node.type == 'import_from':
-			self.endVisitImportFrom(node)
-		if node.type == 'import_name':
-			self.endVisitImportName(node)
-		elif node.type == 'name':
-			self.endVisitName(node)
-		elif node.type == 'string':
-			self.endVisitString(node)
-		elif node.type == 'error_leaf':
-			self.endVisitErrorLeaf(node)
+	def traverseNode(self, node, onTraverseNode = None):
+		self.nameTagIndex = NameTagIndex(node)
+		traverseNodeIteratively(
+			node,
+			{
+				'classdef': self.beginVisitClassdef,
+				'funcdef': self.beginVisitFuncdef,
+				'import_from': self.beginVisitImportFrom,
+				'import_name': self.beginVisitImportName,
+				'name': self.beginVisitName,
+				'string': self.beginVisitString,
+				'error_leaf': self.beginVisitErrorLeaf
+			},
+			{
+				'classdef': self.endVisitClassdef,
+				'funcdef': self.endVisitFuncdef,
+				'import_from': self.endVisitImportFrom,
+				'import_name': self.endVisitImportName,
+				'name': self.endVisitName,
+				'string': self.endVisitString,
+				'error_leaf': self.endVisitErrorLeaf
+			},
+			{},
+			onTraverseNode
+		)
 
 
 	def beginVisitClassdef(self, node):
@@ -324,22 +902,20 @@ class AstVisitor:
 		
 	def recordFunctionOverrideEdge(self, functionNameNode):
 		try:
+			classNode = self.scopeIndex.getParentScopeNode(functionNameNode.parent)
+			if classNode is None or classNode.type != 'classdef':
+				return
+
+			overriddenNameNodes = self.getOverriddenNameNodes(classNode, functionNameNode.value)
+			if len(overriddenNameNodes) == 0:
+				return
+
 			functionNameHierarchy = self.getNameHierarchyOfNode(functionNameNode, self.sourceFilePath)
 			if functionNameHierarchy is None:
 				return
 			functionSymbolId = self.client.recordSymbol(functionNameHierarchy)
-			
-			(startLine, startColumn) = functionNameNode.start_pos
-			script = self.createScript(self.sourceFilePath)
-			for definition in script.goto(line=startLine, column=startColumn, follow_imports=True, follow_override=True):
-				if definition is None:
-					continue
-
-				overriddenNameNode = definition._name.tree_name
-
-				if functionNameNode.start_pos == overriddenNameNode.start_pos:
-					continue
 
+			for overriddenNameNode in overriddenNameNodes:
 				overriddenNameHierarchy = self.getNameHierarchyOfNode(overriddenNameNode, self.sourceFilePath)
 				if overriddenNameHierarchy is None:
 					continue
@@ -354,7 +930,56 @@ class AstVisitor:
 				self.client.recordReferenceLocation(referenceId, getSourceRangeOfNode(overriddenNameNode))
 		except Exception:
 			pass
-			
+
+
+	def getOverriddenNameNodes(self, classNode, memberName):
+		# Does what "goto" with "follow_override" does for the name of a method: the first class in the method resolution
+		# order of the enclosing class that has a member with that name is the one whose member is overridden. The
+		# resolved base classes of each class and the members of each base class are kept in tables, so they are looked
+		# up only once, no matter how many methods and subclasses there are. The tables only live as long as the AstVisitor
+		# of a file, so base classes that are shared by several files (e.g. of a framework) are looked up again for each
+		# of them. Only overridden members of the indexed file are returned, because the location of the override is the
+		# name of the overridden member.
+		script = self.getScript(self.sourceFilePath)
+		baseClasses = self.baseClassTable.get(classNode)
+		if baseClasses is None:
+			classValue = script._get_module_context().create_value(classNode)
+			baseClasses = self.inferOverride(script, lambda: list(classValue.py__mro__())[1:], classNode, memberName) # the first entry is the class itself
+			self.baseClassTable[classNode] = baseClasses
+
+		for baseClass in baseClasses:
+			baseClassNode = getattr(baseClass, 'tree_node', None)
+			key = (baseClassNode if baseClassNode is not None else baseClass, memberName)
+			names = self.memberTable.get(key)
+			if names is None:
+				names = self.inferOverride(script, lambda: convert_names(helpers.filter_follow_imports(baseClass.goto(memberName), False)), classNode, memberName)
+				for name in names:
+					modulePath = name.get_root_context().py__file__()
+					if modulePath is not None:
+						self.referencedModulePaths.add(modulePath)
+				self.memberTable[key] = names
+			if names:
+				moduleNode = self.getModuleNode()
+				return [n.tree_name for n in set(names) if n.tree_name is not None and n.tree_name.get_root_node() is moduleNode]
+		return []
+
+
+	def inferOverride(self, script, function, classNode, memberName):
+		# The lookups of overridden members are limited by the inference time budget like the names themselves. If the
+		# budget is exceeded, no override is recorded for the method.
+		if self.inferenceBudget.isUsedUp():
+			return []
+		try:
+			script.resetInferenceLimits()
+			return self.inferenceBudget.call(function)
+		except InferenceTimeout:
+			print(
+				'WARNING: Looking up the member overridden by method "' + memberName + '" of class "' + classNode.name.value + '" in "' +
+				self.sourceFilePath + '" exceeded the inference time budget. No override is recorded for the method.'
+			)
+			self.discardMemoizedValues()
+			return []
+
 
 	def endVisitFuncdef(self, node):
 		if len(self.contextStack) > 0:
@@ -392,8 +1017,34 @@ class AstVisitor:
 		if node.value in ['True', 'False', 'None']: # these are not parsed as "keywords" in Python 2
 			return
 
+		if self.localNameIndex is not None:
+			functionNode = self.localNameIndex.getFunctionOfLocalName(node)
+			if functionNode is not None:
+				self.hybridStatistics.localNameCount += 1
+				localSymbolId = self.client.recordLocalSymbol(self.getLocalSymbolNameOfNode(node, self.sourceFilePath))
+				self.client.recordLocalSymbolLocation(localSymbolId, getSourceRangeOfNode(node))
+				return
+			self.hybridStatistics.inferredNameCount += 1
+
+		if self.nameTagIndex.isInImportFrom(node) or self.nameTagIndex.isInImportName(node):
+			modules = self.getModulesOfImportedName(node)
+			if modules is not None:
+				self.recordImportedModuleReferences(node, modules)
+				return
+			definitions = self.getDefinitionsOfImportedName(node)
+		else:
+			builtin = self.getBuiltinOfName(node)
+			if builtin is not None:
+				self.recordBuiltinReference(node, builtin)
+				return
+			definitions = self.getDefinitionsOfNode(node, self.sourceFilePath)
+			if len(definitions) == 0 and node.parent.type in ['classdef', 'funcdef'] and node.parent.name is node:
+				# The name of a class or function definition is not a reference, even if it could not be inferred
+				# (e.g. because the inference time budget has been used up).
+				return
+
 		referenceIsUnsolved = True
-		for definition in self.getDefinitionsOfNode(node, self.sourceFilePath):
+		for definition in definitions:
 			if definition is None:
 				continue
 
@@ -503,8 +1154,12 @@ class AstVisitor:
 				if self.recordErrorsForUnsolvedImports(c) is False:
 					return False
 		elif node.type == 'name':
-			if len(self.getDefinitionsOfNode(node, self.sourceFilePath)) == 0:
+			modules = self.getModulesOfImportedName(node)
+			if modules is None:
+				modules = self.getDefinitionsOfImportedName(node)
+			if len(modules) == 0:
 				self.client.recordError('Imported symbol named "' + node.value + '" has not been found.', False, getSourceRangeOfNode(node))
+				self.addUnresolvedImportPaths(node)
 				return False
 		return True
 
@@ -516,7 +1171,7 @@ class AstVisitor:
 			self.client.recordSymbolKind(referencedSymbolId, srctrl.SYMBOL_GLOBAL_VARIABLE)
 
 			referenceKind = srctrl.REFERENCE_USAGE
-			if getParentWithType(node, 'import_from') is not None:
+			if self.nameTagIndex.isInImportFrom(node):
 				# this would be the case for "from foo import f as my_f"
 				#                                             ^    ^
 				referenceKind = srctrl.REFERENCE_IMPORT
@@ -531,23 +1186,39 @@ class AstVisitor:
 		return False
 
 
+	def recordImportedModuleReferences(self, node, modules):
+		referenceIsUnsolved = True
+		for modulePath, nameHierarchy in modules:
+			if modulePath is not None:
+				self.referencedModulePaths.add(modulePath)
+			if nameHierarchy is not None:
+				self.recordModuleReferenceToNameHierarchy(node, nameHierarchy)
+				referenceIsUnsolved = False
+
+		if referenceIsUnsolved:
+			self.client.recordReferenceToUnsolvedSymhol(self.contextStack[-1].id, srctrl.REFERENCE_USAGE, getSourceRangeOfNode(node))
+
+
 	def recordModuleReference(self, node, definition):
-		referencedNameHierarchy = self.getNameHierarchyFromModulePathOfDefinition(definition)
-		if referencedNameHierarchy is None:
-			referencedNameHierarchy = self.getNameHierarchyFromFullNameOfDefinition(definition)
+		referencedNameHierarchy = self.getNameHierarchyOfModuleDefinition(definition)
 		if referencedNameHierarchy is None:
 			return False
 
+		self.recordModuleReferenceToNameHierarchy(node, referencedNameHierarchy)
+		return True
+
+
+	def recordModuleReferenceToNameHierarchy(self, node, referencedNameHierarchy):
 		referencedSymbolId = self.client.recordSymbol(referencedNameHierarchy)
 
 		# Record symbol kind. If the used type is within indexed code, we already have this info. In any other case, this is valuable info!
 		self.client.recordSymbolKind(referencedSymbolId, srctrl.SYMBOL_MODULE)
 
-		if isQualifierNode(node):
+		if self.nameTagIndex.isQualifier(node):
 			self.client.recordQualifierLocation(referencedSymbolId, getSourceRangeOfNode(node))
 		else:
 			referenceKind = srctrl.REFERENCE_USAGE
-			if getParentWithType(node, 'import_name') is not None:
+			if self.nameTagIndex.isInImportName(node):
 				# this would be the case for "import foo"
 				#                                    ^
 				referenceKind = srctrl.REFERENCE_IMPORT
@@ -559,20 +1230,36 @@ class AstVisitor:
 			)
 
 			self.client.recordReferenceLocation(referenceId, getSourceRangeOfNode(node))
-		return True
+
+
+	def recordBuiltinReference(self, node, builtin):
+		(definitionType, referencedNameHierarchy, modulePath) = builtin
+		if modulePath is not None:
+			self.referencedModulePaths.add(modulePath)
+
+		if definitionType == 'class':
+			referenceIsSolved = self.recordClassReferenceToNameHierarchy(node, referencedNameHierarchy)
+		else:
+			referenceIsSolved = self.recordFunctionReferenceToNameHierarchy(node, referencedNameHierarchy)
+
+		if not referenceIsSolved:
+			self.client.recordReferenceToUnsolvedSymhol(self.contextStack[-1].id, srctrl.REFERENCE_USAGE, getSourceRangeOfNode(node))
 
 
 	def recordClassReference(self, node, definition):
 		referencedNameHierarchy = self.getNameHierarchyOfClassOrFunctionDefinition(definition)
 		if referencedNameHierarchy is None:
 			return False
+		return self.recordClassReferenceToNameHierarchy(node, referencedNameHierarchy)
 
+
+	def recordClassReferenceToNameHierarchy(self, node, referencedNameHierarchy):
 		referencedSymbolId = self.client.recordSymbol(referencedNameHierarchy)
 
 		# Record symbol kind. If the used type is within indexed code, we already have this info. In any other case, this is valuable info!
 		self.client.recordSymbolKind(referencedSymbolId, srctrl.SYMBOL_CLASS)
 
-		if isQualifierNode(node):
+		if self.nameTagIndex.isQualifier(node):
 			self.client.recordQualifierLocation(referencedSymbolId, getSourceRangeOfNode(node))
 		else:
 			referenceKind = srctrl.REFERENCE_TYPE_USAGE
@@ -585,7 +1272,7 @@ class AstVisitor:
 					# this would be the case for "class Foo(Bar, Baz)"
 					#                                       ^    ^
 					referenceKind = srctrl.REFERENCE_INHERITANCE
-				elif getParentWithType(node, 'import_from') is not None:
+				elif self.nameTagIndex.isInImportFrom(node):
 					# this would be the case for "from foo import Foo as F"
 					#                                             ^      ^
 					referenceKind = srctrl.REFERENCE_IMPORT
@@ -597,9 +1284,8 @@ class AstVisitor:
 			)
 			self.client.recordReferenceLocation(referenceId, getSourceRangeOfNode(node))
 
-			if referenceKind == srctrl.REFERENCE_TYPE_USAGE and isCallNode(node):
-				constructorNameHierarchy = referencedNameHierarchy.copy()
-				constructorNameHierarchy.nameElements.append(NameElement('__init__'))
+			if referenceKind == srctrl.REFERENCE_TYPE_USAGE and self.nameTagIndex.isCall(node):
+				constructorNameHierarchy = referencedNameHierarchy.copyAndAppend(NameElement('__init__'))
 				constructorSymbolId = self.client.recordSymbol(constructorNameHierarchy)
 				self.client.recordSymbolKind(constructorSymbolId, srctrl.SYMBOL_METHOD)
 				callReferenceId = self.client.recordReference(
@@ -616,16 +1302,19 @@ class AstVisitor:
 		referencedNameHierarchy = self.getNameHierarchyOfClassOrFunctionDefinition(definition)
 		if referencedNameHierarchy is None:
 			return False
+		return self.recordFunctionReferenceToNameHierarchy(node, referencedNameHierarchy)
+
 
+	def recordFunctionReferenceToNameHierarchy(self, node, referencedNameHierarchy):
 		referencedSymbolId = self.client.recordSymbol(referencedNameHierarchy)
 
 		# Record symbol kind. If the called function is within indexed code, we already have this info. In any other case, this is valuable info!
 		self.client.recordSymbolKind(referencedSymbolId, srctrl.SYMBOL_FUNCTION)
 
 		referenceKind = -1
-		if isCallNode(node):
+		if self.nameTagIndex.isCall(node):
 			referenceKind = srctrl.REFERENCE_CALL
-		elif getParentWithType(node, 'import_from'):
+		elif self.nameTagIndex.isInImportFrom(node):
 			referenceKind = srctrl.REFERENCE_IMPORT
 
 		if referenceKind == -1:
@@ -660,10 +1349,10 @@ class AstVisitor:
 		definitionKind = None
 
 		definitionNameNode = definition._name.tree_name
-		namedDefinitionParentNode = getParentWithTypeInList(definitionNameNode, ['classdef', 'funcdef'])
+		namedDefinitionParentNode = self.scopeIndex.getParentScopeNode(definitionNameNode)
 		if namedDefinitionParentNode is not None:
 			if namedDefinitionParentNode.type in ['classdef']:
-				if getNamedParentNode(definitionNameNode) == namedDefinitionParentNode:
+				if self.scopeIndex.getNamedParentNode(definitionNameNode) == namedDefinitionParentNode:
 					# definition is not local to some other field instantiation but instead it is a static member variable
 					if definitionNameNode.start_pos == node.start_pos and definitionNameNode.end_pos == node.end_pos:
 						# node is the definition of the static member variable
@@ -675,14 +1364,14 @@ class AstVisitor:
 			elif namedDefinitionParentNode.type in ['funcdef']:
 				# definition may be a non-static member variable
 				if definitionNameNode.parent is not None and definitionNameNode.parent.type == 'trailer':
-					potentialParamNode = getNamedParentNode(definitionNameNode)
+					potentialParamNode = self.scopeIndex.getNamedParentNode(definitionNameNode)
 					if potentialParamNode is not None:
 						for potentialParamDefinition in self.getDefinitionsOfNode(potentialParamNode, definitionModulePath):
 							if potentialParamDefinition is not None and potentialParamDefinition.type == 'param':
 								paramDefinitionNameNode = potentialParamDefinition._name.tree_name
-								potentialFuncdefNode = getNamedParentNode(paramDefinitionNameNode)
+								potentialFuncdefNode = self.scopeIndex.getNamedParentNode(paramDefinitionNameNode)
 								if potentialFuncdefNode is not None and potentialFuncdefNode.type == 'funcdef':
-									potentialClassdefNode = getNamedParentNode(potentialFuncdefNode)
+									potentialClassdefNode = self.scopeIndex.getNamedParentNode(potentialFuncdefNode)
 									if potentialClassdefNode is not None and potentialClassdefNode.type == 'classdef':
 										preceedingNode = paramDefinitionNameNode.parent.get_previous_sibling()
 										if preceedingNode is not None and preceedingNode.type != 'param':
@@ -696,7 +1385,7 @@ class AstVisitor:
 			if definitionNameNode.start_pos == node.start_pos and definitionNameNode.end_pos == node.end_pos:
 				# node is the definition of a global variable
 				definitionKind = srctrl.DEFINITION_EXPLICIT
-			elif getParentWithType(node, 'import_from') is not None:
+			elif self.nameTagIndex.isInImportFrom(node):
 				# this would be the case for "from foo import f as my_f"
 				#                                             ^    ^
 				referenceKind = srctrl.REFERENCE_IMPORT
@@ -733,13 +1422,14 @@ class AstVisitor:
 
 
 	def getLocalSymbolName(self, definition):
-		definitionNameNode = definition._name.tree_name
-
 		definitionModulePath = definition.module_path
 		if definitionModulePath is None:
 			if self.sourceFilePath == _virtualFilePath:
 				definitionModulePath = self.sourceFilePath
+		return self.getLocalSymbolNameOfNode(definition._name.tree_name, definitionModulePath)
 
+
+	def getLocalSymbolNameOfNode(self, definitionNameNode, definitionModulePath):
 		contextName = ''
 		if definitionModulePath is not None:
 			parentFuncdef = getParentWithType(definitionNameNode, 'funcdef')
@@ -760,93 +1450,55 @@ class AstVisitor:
 		if filePath is None:
 			return None
 
-		if filePath == _virtualFilePath:
-			return NameHierarchy(NameElement(os.path.splitext(_virtualFilePath)[0]), '.')
-
-		filePath = os.path.abspath(filePath)
-		filePath = os.path.splitext(filePath)[0]
-
-		sysPath = []
-
-		jediPath = os.path.dirname(jedi.__file__)
-		major = self.environment.version_info.major
-		minor = self.environment.version_info.minor
-		if major == 2:
-			sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/2'))
-		if major == 2 or major == 3:
-			sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/2and3'))
-		if major == 3:
-			sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/3'))
-			if minor == 5:
-				sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/3.5'))
-			if minor == 6:
-				sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/3.6'))
-			if minor == 7:
-				sysPath.append(os.path.abspath(jediPath + '/third_party/typeshed/stdlib/3.7'))
-
-		sysPath.extend(self.sysPath)
-
-		for p in sysPath:
-			if filePath.startswith(p):
-				rest = filePath[len(p):]
-				if rest.startswith(os.path.sep):
-					# Remove a slash in cases it's still there.
-					rest = rest[1:]
-				if rest:
-					split = rest.split(os.path.sep)
-					for string in split:
-						if not string:
-							return None
-
-					if split[-1] == '__init__':
-						split = split[:-1]
-					if split[-1] == '__builtin__':
-						split = split[:-1]
-						split.insert(0, 'builtins')
-
-					nameHierarchy = None
-					for namePart in split:
-						if nameHierarchy is None:
-							nameHierarchy = NameHierarchy(NameElement(namePart), '.')
-						else:
-							nameHierarchy.nameElements.append(NameElement(namePart))
-					return nameHierarchy
+		if filePath in self.moduleNameHierarchyCache:
+			return self.moduleNameHierarchyCache[filePath]
 
-		return None
+		if filePath == _virtualFilePath:
+			nameHierarchy = NameHierarchy(NameElement(os.path.splitext(_virtualFilePath)[0]), '.')
+		else:
+			nameHierarchy = None
+			split = self.modulePathIndex.getModuleNames(os.path.splitext(os.path.abspath(filePath))[0])
+			if split is not None:
+				if split[-1] == '__init__':
+					split = split[:-1]
+				if split[-1] == '__builtin__':
+					split = split[:-1]
+					split.insert(0, 'builtins')
+				nameHierarchy = getNameHierarchyFromNames(split, '.')
+
+		self.moduleNameHierarchyCache[filePath] = nameHierarchy
+		return nameHierarchy
 
 
 	def getNameHierarchyFromModulePathOfDefinition(self, definition):
 		nameHierarchy = self.getNameHierarchyFromModuleFilePath(definition.module_path)
 		if nameHierarchy is not None:
 			if nameHierarchy.nameElements[-1].name != definition.name:
-				nameHierarchy.nameElements.append(NameElement(definition.name))
+				nameHierarchy = nameHierarchy.copyAndAppend(NameElement(definition.name))
 		return nameHierarchy
 
 
-	def getNameHierarchyFromFullNameOfDefinition(self, definition):
-		nameHierarchy = None
-		for namePart in definition.full_name.split('.'):
-			if nameHierarchy is None:
-				nameHierarchy = NameHierarchy(NameElement(namePart), '.')
-			else:
-				nameHierarchy.nameElements.append(NameElement(namePart))
+	def getNameHierarchyOfModuleDefinition(self, definition):
+		nameHierarchy = self.getNameHierarchyFromModulePathOfDefinition(definition)
+		if nameHierarchy is None:
+			nameHierarchy = self.getNameHierarchyFromFullNameOfDefinition(definition)
 		return nameHierarchy
 
 
+	def getNameHierarchyFromFullNameOfDefinition(self, definition):
+		return getNameHierarchyFromNames(definition.full_name.split('.'), '.')
+
+
 	def getNameHierarchyOfClassOrFunctionDefinition(self, definition):
 		if definition is None:
 			return None
 
 		if definition.line is None and definition.column is None:
 			if definition.module_name in ['builtins', '__builtin__']:
-				nameHierarchy = NameHierarchy(NameElement('builtins'), '.')
 				if definition.full_name is not None:
-					for namePart in definition.full_name.split('.'):
-						nameHierarchy.nameElements.append(NameElement(namePart))
+					return getNameHierarchyFromNames(['builtins'] + definition.full_name.split('.'), '.')
 				else:
-					for namePart in definition.name.split('.'):
-						nameHierarchy.nameElements.append(NameElement(namePart))
-				return nameHierarchy
+					return getNameHierarchyFromNames(['builtins'] + definition.name.split('.'), '.')
 			else:
 				return self.getNameHierarchyFromFullNameOfDefinition(definition)
 
@@ -865,13 +1517,204 @@ class AstVisitor:
 
 
 	def getDefinitionsOfNode(self, node, nodeSourceFilePath):
-		try:
-			(startLine, startColumn) = node.start_pos
-			script = self.createScript(nodeSourceFilePath)
-			return script.goto(line=startLine, column=startColumn, follow_imports=True)
+		(startLine, startColumn) = node.start_pos
+		key = (nodeSourceFilePath, startLine, startColumn)
+		if self.definitionCache.contains(key):
+			return self.definitionCache.get(key)
+
+		definitions = []
+		if self.inferenceBudget.isUsedUp():
+			if not self.inferenceBudget.isUsedUpReported:
+				self.inferenceBudget.isUsedUpReported = True
+				print(
+					'WARNING: Used up the inference time budget of ' + str(self.inferenceBudget.fileTimeLimit) + ' seconds for source file "' +
+					self.sourceFilePath + '" at ' + getSourceRangeOfNode(node).toString() + '. The remaining names are recorded as unsolved.'
+				)
+		else:
+			try:
+				script = self.getScript(nodeSourceFilePath)
+				definitions = self.inferenceBudget.call(lambda: script.goto(line=startLine, column=startColumn, follow_imports=True))
+			except InferenceTimeout:
+				print(
+					'WARNING: Inferring the definition of name "' + node.value + '" at ' + getSourceRangeOfNode(node).toString() + ' in "' +
+					nodeSourceFilePath + '" exceeded the inference time budget. The name is recorded as unsolved.'
+				)
+				self.discardMemoizedValues()
+			except Exception:
+				pass
 
-		except Exception:
-			return []
+		self.addReferencedModulePaths(definitions)
+		self.definitionCache.put(key, definitions)
+		return definitions
+
+
+	def getDefinitionsOfImportedName(self, node):
+		# The names of an import statement are resolved when the statement is visited to record errors for unsolved
+		# imports, and again when the names themselves are visited to record the import references. Unlike the
+		# definition cache, the import table of a file is never evicted, so each imported name is resolved only once.
+		definitions = self.importTable.get(node.start_pos)
+		if definitions is None:
+			definitions = self.getDefinitionsOfNode(node, self.sourceFilePath)
+			self.importTable[node.start_pos] = definitions
+		return definitions
+
+
+	def getBuiltinOfName(self, node):
+		# Returns the entry of the builtins index for a name that refers to a builtin class or function. The index is only
+		# used if no name with the same value is defined anywhere in the indexed file, so the name cannot be shadowed.
+		if self.builtinsIndex is None:
+			self.builtinsIndex = getBuiltinsIndex(self.environment, self.inferenceBudget.nameTimeLimit)
+		builtin = self.builtinsIndex.get(node.value)
+		if builtin is None:
+			return None
+
+		parentNode = node.parent
+		if parentNode.type == 'trailer':
+			return None # the name of an attribute, e.g. "foo.len"
+		if parentNode.type == 'argument' and parentNode.children[0] is node and len(parentNode.children) > 1:
+			return None # the name of a keyword argument, e.g. "foo(len=1)"
+
+		isShadowed = self.shadowedBuiltinNames.get(node.value)
+		if isShadowed is None:
+			moduleNode = self.getModuleNode()
+			isShadowed = any(importNode.is_star_import() for importNode in moduleNode.iter_imports())
+			if not isShadowed:
+				isShadowed = any(nameNode.is_definition() for nameNode in moduleNode.get_used_names().get(node.value, []))
+			self.shadowedBuiltinNames[node.value] = isShadowed
+		if isShadowed:
+			return None
+		return builtin
+
+
+	def getModulesOfImportedName(self, node):
+		# Returns the paths and name hierarchies of the modules that a name within the module name of an import statement
+		# refers to, using the import cache that is shared by all files. Returns None for any other imported name.
+		if node.start_pos in self.importedModuleTable:
+			return self.importedModuleTable[node.start_pos]
+
+		modules = None
+		key = self.getImportCacheKey(node)
+		if key is not None:
+			modules = _importCache.get(key)
+			if modules is None:
+				definitions = self.getDefinitionsOfImportedName(node)
+				# unresolved imports are not cached, since they may be resolved by modules that are added later on
+				if len(definitions) > 0 and all(definition is not None and definition.type == 'module' for definition in definitions):
+					modules = [(d.module_path, self.getNameHierarchyOfModuleDefinition(d)) for d in definitions]
+					_importCache.put(key, modules)
+		self.importedModuleTable[node.start_pos] = modules
+		return modules
+
+
+	def getImportCacheKeyPrefix(self):
+		if self.sourceFileContent is None or 'sys.path' in self.sourceFileContent:
+			# jedi applies modifications of the sys.path that are made by the importing file itself
+			return None
+
+		fingerprint = hashlib.sha256()
+		fingerprint.update(json.dumps([getFileFingerprint(self.environment.executable)] + [[p, getFileFingerprint(p)] for p in self.sysPath]).encode('utf-8'))
+		return (self.environment.executable, fingerprint.hexdigest(), os.path.dirname(os.path.abspath(self.sourceFilePath)))
+
+
+	def getImportCacheKey(self, node):
+		if self.importCacheKeyPrefix is None:
+			return None
+
+		parentNode = node.parent
+		dottedNameNode = None
+		if parentNode.type == 'dotted_name':
+			dottedNameNode = parentNode
+			parentNode = parentNode.parent
+
+		if parentNode.type == 'dotted_as_name':
+			if parentNode.children[0] is not (dottedNameNode if dottedNameNode is not None else node):
+				return None # the alias of "import foo as bar"
+			parentNode = parentNode.parent
+		if parentNode.type == 'dotted_as_names':
+			parentNode = parentNode.parent
+
+		level = 0
+		if parentNode.type == 'import_from':
+			for child in parentNode.children[1:]:
+				if child.type == 'operator': # "." or "..."
+					level += len(child.value)
+				elif child is dottedNameNode or child is node:
+					break
+				else:
+					return None # an imported name or the module part consists of dots only
+		elif parentNode.type != 'import_name':
+			return None
+
+		if dottedNameNode is None:
+			names = [node.value]
+		else:
+			names = []
+			for child in dottedNameNode.children:
+				if child.type == 'name':
+					names.append(child.value)
+				if child is node:
+					break
+		return self.importCacheKeyPrefix + ('.'.join(names), level)
+
+
+	def discardMemoizedValues(self):
+		# Values that were being inferred when inference was interrupted may have been memoized with the defaults that
+		# jedi uses for recursions.
+		for script in self.scriptCache.values():
+			script._inference_state.memoize_cache.clear()
+
+
+	def addReferencedModulePaths(self, definitions):
+		for definition in definitions:
+			if definition is not None and definition.module_path is not None:
+				self.referencedModulePaths.add(definition.module_path)
+
+
+	def getReferencedModulePaths(self):
+		# Returns the paths of all other modules that jedi resolved references to while indexing. The indexed data
+		# may change whenever one of these modules changes.
+		return set(p for p in self.referencedModulePaths if p != self.sourceFilePath)
+
+
+	def addUnresolvedImportPaths(self, node):
+		# Adds the paths at which a module or package would be found for the name of an import statement that could not
+		# be resolved. Only paths that do not exist yet are added.
+		if self.sourceFilePath == _virtualFilePath:
+			return
+
+		importNode = parso.tree.search_ancestor(node, 'import_name', 'import_from')
+		if importNode is None:
+			return
+
+		names = [node.value]
+		if node.parent.type == 'dotted_name':
+			dottedNames = [c for c in node.parent.children if c.type == 'name']
+			names = [c.value for c in dottedNames[:dottedNames.index(node) + 1]]
+
+		rootPaths = self.sysPath
+		if self.project is not None:
+			rootPaths = [self.project.path] + rootPaths # jedi searches the directory of the project as well
+		if importNode.type == 'import_from':
+			fromNames = importNode.get_from_names()
+			if not any(n is node for n in fromNames):
+				# "from foo import bar" may import the module "foo.bar"
+				names = [n.value for n in fromNames] + names
+			if importNode.level > 0:
+				rootPath = os.path.dirname(self.sourceFilePath)
+				for i in range(importNode.level - 1):
+					rootPath = os.path.dirname(rootPath)
+				rootPaths = [rootPath]
+
+		for rootPath in rootPaths:
+			path = os.path.join(rootPath, *names)
+			if not isModulePath(path):
+				self.unresolvedImportPaths.add(path)
+
+
+	def getUnresolvedImportPaths(self):
+		# Returns the paths (without extension) at which a module or package would resolve one of the imports that could
+		# not be resolved while indexing. The indexed data may change as soon as a module is added at one of these paths.
+		return set(self.unresolvedImportPaths)
 
 
 	def getNameHierarchyOfNode(self, node, nodeSourceFilePath):
@@ -886,6 +1729,18 @@ class AstVisitor:
 		if nameNode is None:
 			return None
 
+		# The returned name hierarchies are shared via this cache, so callers need to use "copyAndAppend" instead of
+		# modifying them.
+		key = (nodeSourceFilePath, nameNode.start_pos)
+		if key in self.nameHierarchyCache:
+			return self.nameHierarchyCache[key]
+
+		nameHierarchy = self.deriveNameHierarchyOfNameNode(nameNode, nodeSourceFilePath)
+		self.nameHierarchyCache[key] = nameHierarchy
+		return nameHierarchy
+
+
+	def deriveNameHierarchyOfNameNode(self, nameNode, nodeSourceFilePath):
 		# we derive the name for the canonical node (e.g. the node's definition)
 		for definition in self.getDefinitionsOfNode(nameNode, nodeSourceFilePath):
 			if definition is None:
@@ -902,8 +1757,8 @@ class AstVisitor:
 			if definitionNameNode is None:
 				continue
 
-			parentNode = getParentWithTypeInList(definitionNameNode.parent, ['classdef', 'funcdef'])
-			potentialSelfNode = getNamedParentNode(definitionNameNode)
+			parentNode = self.scopeIndex.getParentScopeNode(definitionNameNode.parent)
+			potentialSelfNode = self.scopeIndex.getNamedParentNode(definitionNameNode)
 			# if the node is defines as a non-static member variable, we remove the "function_name.self" from the
 			# name hierarchy (e.g. "Foo.__init__.self.bar" gets shortened to "Foo.bar")
 			if potentialSelfNode is not None:
@@ -915,11 +1770,11 @@ class AstVisitor:
 
 						potentialSelfDefinitionNameNode = potentialSelfDefinition._name.tree_name
 
-						potentialFuncdefNode = getNamedParentNode(potentialSelfDefinitionNameNode)
+						potentialFuncdefNode = self.scopeIndex.getNamedParentNode(potentialSelfDefinitionNameNode)
 						if potentialFuncdefNode is None or potentialFuncdefNode.type != 'funcdef':
 							continue
 
-						potentialClassdefNode = getNamedParentNode(potentialFuncdefNode)
+						potentialClassdefNode = self.scopeIndex.getNamedParentNode(potentialFuncdefNode)
 						if potentialClassdefNode is None or potentialClassdefNode.type != 'classdef':
 							continue
 
@@ -934,45 +1789,81 @@ class AstVisitor:
 				parentNodeNameHierarchy = self.getNameHierarchyOfNode(parentNode, definitionModulePath)
 				if parentNodeNameHierarchy is None:
 					return None
-				parentNodeNameHierarchy.nameElements.append(nameElement)
-				return parentNodeNameHierarchy
+				return parentNodeNameHierarchy.copyAndAppend(nameElement)
 
 			nameHierarchy = self.getNameHierarchyFromModuleFilePath(nodeSourceFilePath)
 			if nameHierarchy is None:
 				return None
-			nameHierarchy.nameElements.append(nameElement)
-			return nameHierarchy
+			return nameHierarchy.copyAndAppend(nameElement)
 
 		return None
 
 
+	def printCacheStatistics(self):
+		print('INFO: Definition cache: ' + self.definitionCache.getStatisticsString() + '.')
+		print('INFO: Import cache: ' + _importCache.getStatisticsString() + '.')
+		if self.localNameIndex is not None:
+			print('INFO: Hybrid indexing: ' + self.hybridStatistics.getStatisticsString() + '.')
+
+
+	def getScript(self, sourceFilePath):
+		# Each file is read, parsed and wrapped into a Script only once per visitor. Reusing the Script also
+		# reuses its inference state, so jedi does not need to infer the same values over and over again.
+		script = self.scriptCache.get(sourceFilePath)
+		if script is None:
+			script = self.createScript(sourceFilePath)
+			self.scriptCache[sourceFilePath] = script
+		return script
+
+
+	def getModuleNode(self):
+		# The tree of the indexed file is taken from its Script, so the nodes that are traversed are the same nodes that
+		# jedi runs its inference on and the file does not need to be parsed twice.
+		return self.getScript(self.sourceFilePath)._module_node
+
+
 	def createScript(self, sourceFilePath):
 		if sourceFilePath == _virtualFilePath: # we are indexing a provided code snippet
 			return SourcetrailScript(
 				source = self.sourceFileContent,
 				environment = self.environment,
-				sys_path = self.sysPath
+				sys_path = self.sysPath,
+				_project = self.project
 			)
 		else: # we are indexing a real file
+			source = None
+			if sourceFilePath == self.sourceFilePath:
+				# use the code that has already been read instead of reading the file again
+				source = self.sourceFileContent
 			return SourcetrailScript(
-				source = None,
+				source = source,
 				path = sourceFilePath,
 				environment = self.environment,
-				sys_path = self.sysPath
+				sys_path = self.sysPath,
+				_project = self.project
 			)
 
 
 class VerboseAstVisitor(AstVisitor):
 
-	def __init__(self, client, evaluator, sourceFilePath, sourceFileContent = None, sysPath = None):
-		AstVisitor.__init__(self, client, evaluator, sourceFilePath, sourceFileContent, sysPath)
-		self.indentationLevel = 0
+	def __init__(
+		self, client, environment, sourceFilePath, sourceFileContent = None, sysPath = None, definitionCacheSize = _defaultDefinitionCacheSize,
+		nameInferenceBudget = None, fileInferenceBudget = None, hybrid = False, project = None
+	):
+		AstVisitor.__init__(
+			self, client, environment, sourceFilePath, sourceFileContent, sysPath, definitionCacheSize, nameInferenceBudget, fileInferenceBudget, hybrid,
+			project
+		)
 		self.indentationToken = '| '
 
 
 	def traverseNode(self, node):
+		AstVisitor.traverseNode(self, node, self.printNode)
+
+
+	def printNode(self, node, depth):
 		currentString = ''
-		for i in range(0, self.indentationLevel):
+		for i in range(0, depth):
 			currentString += self.indentationToken
 
 		currentString += node.type
@@ -984,15 +1875,17 @@ class VerboseAstVisitor(AstVisitor):
 
 		print('AST: ' + currentString)
 
-		self.indentationLevel += 1
-		AstVisitor.traverseNode(self, node)
-		self.indentationLevel -= 1
-
 
 class AstVisitorClient:
 
 	def __init__(self):
 		self.indexedFileId = 0
+		# Most symbols are recorded many times (once for each reference). Remembering the ids and kinds that have
+		# already been written avoids asking the database for data it already knows. This is only valid as long as the
+		# database is not modified by anyone else, so a client should not outlive the open database.
+		self.symbolIds = {}
+		self.symbolKinds = {}
+		self.symbolDefinitionKinds = {}
 		if srctrl.isCompatible():
 			print('INFO: Loaded database is compatible.')
 		else:
@@ -1003,17 +1896,26 @@ class AstVisitorClient:
 
 	def recordSymbol(self, nameHierarchy):
 		if nameHierarchy is not None:
-			symbolId = srctrl.recordSymbol(nameHierarchy.serialize())
+			serializedNameHierarchy = nameHierarchy.serialize()
+			symbolId = self.symbolIds.get(serializedNameHierarchy)
+			if symbolId is None:
+				symbolId = srctrl.recordSymbol(serializedNameHierarchy)
+				if symbolId:
+					self.symbolIds[serializedNameHierarchy] = symbolId
 			return symbolId
 		return 0
 
 
 	def recordSymbolDefinitionKind(self, symbolId, symbolDefinitionKind):
-		srctrl.recordSymbolDefinitionKind(symbolId, symbolDefinitionKind)
+		if self.symbolDefinitionKinds.get(symbolId) != symbolDefinitionKind:
+			srctrl.recordSymbolDefinitionKind(symbolId, symbolDefinitionKind)
+			self.symbolDefinitionKinds[symbolId] = symbolDefinitionKind
 
 
 	def recordSymbolKind(self, symbolId, symbolKind):
-		srctrl.recordSymbolKind(symbolId, symbolKind)
+		if self.symbolKinds.get(symbolId) != symbolKind:
+			srctrl.recordSymbolKind(symbolId, symbolKind)
+			self.symbolKinds[symbolId] = symbolKind
 
 
 	def recordSymbolLocation(self, symbolId, sourceRange):
@@ -1142,56 +2044,372 @@ class AstVisitorClient:
 		)
 
 
-class SourceRange:
+class RecordingAstVisitorClient:
+	# This client does not write to the database but keeps all calls in a list of records that can be replayed to a
+	# different client later on (e.g. in the process that owns the database connection). The ids handed out by this
+	# client are only valid within its records and are translated to the ids of the target client on replay.
+
+	def __init__(self):
+		self.records = []
+		self.nextElementId = 1
+
+
+	def getNextElementId(self):
+		id = self.nextElementId
+		self.nextElementId += 1
+		return id
+
+
+	def addRecord(self, methodName, args, returnsId = False):
+		resultId = self.getNextElementId() if returnsId else None
+		self.records.append((methodName, resultId, args))
+		return resultId
+
+
+	def recordSymbol(self, nameHierarchy):
+		if nameHierarchy is not None:
+			return self.addRecord('recordSymbol', (nameHierarchy,), True)
+		return 0
+
+
+	def recordSymbolDefinitionKind(self, symbolId, symbolDefinitionKind):
+		self.addRecord('recordSymbolDefinitionKind', (symbolId, symbolDefinitionKind))
+
+
+	def recordSymbolKind(self, symbolId, symbolKind):
+		self.addRecord('recordSymbolKind', (symbolId, symbolKind))
+
+
+	def recordSymbolLocation(self, symbolId, sourceRange):
+		self.addRecord('recordSymbolLocation', (symbolId, sourceRange))
+
+
+	def recordSymbolScopeLocation(self, symbolId, sourceRange):
+		self.addRecord('recordSymbolScopeLocation', (symbolId, sourceRange))
+
+
+	def recordSymbolSignatureLocation(self, symbolId, sourceRange):
+		self.addRecord('recordSymbolSignatureLocation', (symbolId, sourceRange))
+
+
+	def recordReference(self, contextSymbolId, referencedSymbolId, referenceKind):
+		return self.addRecord('recordReference', (contextSymbolId, referencedSymbolId, referenceKind), True)
+
+
+	def recordReferenceLocation(self, referenceId, sourceRange):
+		self.addRecord('recordReferenceLocation', (referenceId, sourceRange))
+
+
+	def recordReferenceIsAmbiguous(self, referenceId):
+		self.addRecord('recordReferenceIsAmbiguous', (referenceId,))
+
+
+	def recordReferenceToUnsolvedSymhol(self, contextSymbolId, referenceKind, sourceRange):
+		return self.addRecord('recordReferenceToUnsolvedSymhol', (contextSymbolId, referenceKind, sourceRange), True)
+
+
+	def recordQualifierLocation(self, referencedSymbolId, sourceRange):
+		self.addRecord('recordQualifierLocation', (referencedSymbolId, sourceRange))
+
 
-	def __init__(self, startLine, startColumn, endLine, endColumn):
-		self.startLine = startLine
-		self.startColumn = startColumn
-		self.endLine = endLine
-		self.endColumn = endColumn
+	def recordFile(self, filePath):
+		return self.addRecord('recordFile', (filePath,), True)
+
+
+	def recordFileLanguage(self, fileId, languageIdentifier):
+		self.addRecord('recordFileLanguage', (fileId, languageIdentifier))
 
 
+	def recordLocalSymbol(self, name):
+		return self.addRecord('recordLocalSymbol', (name,), True)
+
+
+	def recordLocalSymbolLocation(self, localSymbolId, sourceRange):
+		self.addRecord('recordLocalSymbolLocation', (localSymbolId, sourceRange))
+
+
+	def recordAtomicSourceRange(self, sourceRange):
+		self.addRecord('recordAtomicSourceRange', (sourceRange,))
+
+
+	def recordError(self, message, fatal, sourceRange):
+		self.addRecord('recordError', (message, fatal, sourceRange))
+
+
+class BufferedAstVisitorClient:
+	# This client collects the data of an indexed file in memory and forwards it to the wrapped client once "flush" is
+	# called. Data that is recorded multiple times (e.g. the kind of a symbol that is recorded for each of its
+	# references) is only forwarded once. Similar to the RecordingAstVisitorClient, the ids handed out by this client
+	# are only valid until the data is flushed.
+
+	def __init__(self, client):
+		self.client = client
+		self.receivedCallCount = 0
+		self.forwardedCallCount = 0
+		self.clear()
+
+
+	def clear(self):
+		self.nextElementId = 1
+		self.files = {}
+		self.fileLanguages = {}
+		self.symbols = {}
+		self.symbolKinds = {}
+		self.symbolDefinitionKinds = {}
+		self.symbolLocations = {}
+		self.references = {}
+		self.referenceLocations = {}
+		self.ambiguousReferences = {}
+		self.unsolvedReferences = {}
+		self.qualifierLocations = {}
+		self.localSymbols = {}
+		self.localSymbolLocations = {}
+		self.atomicSourceRanges = {}
+		self.errors = {}
+
+
+	def getSavedCallCount(self):
+		return self.receivedCallCount - self.forwardedCallCount
+
+
+	def getNextElementId(self):
+		id = self.nextElementId
+		self.nextElementId += 1
+		return id
+
+
+	def getIdOfEntry(self, table, key):
+		self.receivedCallCount += 1
+		id = table.get(key)
+		if id is None:
+			id = self.getNextElementId()
+			table[key] = id
+		return id
+
+
+	def addEntry(self, table, key, value = None):
+		self.receivedCallCount += 1
+		table[key] = value
+
+
+	def flush(self):
+		# Forwarding happens in an order that makes sure that all ids are known by the wrapped client before they are used.
+		client = self.client
+		idMap = { 0: 0 }
+		forwardedCallCount = 0
+
+		for filePath, fileId in self.files.items():
+			idMap[fileId] = client.recordFile(filePath)
+		for fileId, languageIdentifier in self.fileLanguages.items():
+			client.recordFileLanguage(idMap[fileId], languageIdentifier)
+		for nameHierarchy, symbolId in self.symbols.values():
+			idMap[symbolId] = client.recordSymbol(nameHierarchy)
+		for symbolId, symbolKind in self.symbolKinds.items():
+			client.recordSymbolKind(idMap[symbolId], symbolKind)
+		for symbolId, symbolDefinitionKind in self.symbolDefinitionKinds.items():
+			client.recordSymbolDefinitionKind(idMap[symbolId], symbolDefinitionKind)
+		for (methodName, symbolId, rangeKey), sourceRange in self.symbolLocations.items():
+			getattr(client, methodName)(idMap[symbolId], sourceRange)
+		for (contextSymbolId, referencedSymbolId, referenceKind), referenceId in self.references.items():
+			idMap[referenceId] = client.recordReference(idMap[contextSymbolId], idMap[referencedSymbolId], referenceKind)
+		for (referenceId, rangeKey), sourceRange in self.referenceLocations.items():
+			client.recordReferenceLocation(idMap[referenceId], sourceRange)
+		for referenceId in self.ambiguousReferences:
+			client.recordReferenceIsAmbiguous(idMap[referenceId])
+		for (contextSymbolId, referenceKind, rangeKey), (sourceRange, referenceId) in self.unsolvedReferences.items():
+			idMap[referenceId] = client.recordReferenceToUnsolvedSymhol(idMap[contextSymbolId], referenceKind, sourceRange)
+		for (symbolId, rangeKey), sourceRange in self.qualifierLocations.items():
+			client.recordQualifierLocation(idMap[symbolId], sourceRange)
+		for name, localSymbolId in self.localSymbols.items():
+			idMap[localSymbolId] = client.recordLocalSymbol(name)
+		for (localSymbolId, rangeKey), sourceRange in self.localSymbolLocations.items():
+			client.recordLocalSymbolLocation(idMap[localSymbolId], sourceRange)
+		for rangeKey, sourceRange in self.atomicSourceRanges.items():
+			client.recordAtomicSourceRange(sourceRange)
+		for (message, fatal, rangeKey), sourceRange in self.errors.items():
+			client.recordError(message, fatal, sourceRange)
+
+		for table in [
+			self.files, self.fileLanguages, self.symbols, self.symbolKinds, self.symbolDefinitionKinds, self.symbolLocations, self.references,
+			self.referenceLocations, self.ambiguousReferences, self.unsolvedReferences, self.qualifierLocations, self.localSymbols,
+			self.localSymbolLocations, self.atomicSourceRanges, self.errors
+		]:
+			forwardedCallCount += len(table)
+		self.forwardedCallCount += forwardedCallCount
+		self.clear()
+
+
+	def recordSymbol(self, nameHierarchy):
+		if nameHierarchy is None:
+			return 0
+		self.receivedCallCount += 1
+		serializedNameHierarchy = nameHierarchy.serialize()
+		entry = self.symbols.get(serializedNameHierarchy)
+		if entry is None:
+			entry = (nameHierarchy, self.getNextElementId())
+			self.symbols[serializedNameHierarchy] = entry
+		return entry[1]
+
+
+	def recordSymbolDefinitionKind(self, symbolId, symbolDefinitionKind):
+		self.addEntry(self.symbolDefinitionKinds, symbolId, symbolDefinitionKind)
+
+
+	def recordSymbolKind(self, symbolId, symbolKind):
+		self.addEntry(self.symbolKinds, symbolId, symbolKind)
+
+
+	def recordSymbolLocation(self, symbolId, sourceRange):
+		self.addEntry(self.symbolLocations, ('recordSymbolLocation', symbolId, sourceRange), sourceRange)
+
+
+	def recordSymbolScopeLocation(self, symbolId, sourceRange):
+		self.addEntry(self.symbolLocations, ('recordSymbolScopeLocation', symbolId, sourceRange), sourceRange)
+
+
+	def recordSymbolSignatureLocation(self, symbolId, sourceRange):
+		self.addEntry(self.symbolLocations, ('recordSymbolSignatureLocation', symbolId, sourceRange), sourceRange)
+
+
+	def recordReference(self, contextSymbolId, referencedSymbolId, referenceKind):
+		return self.getIdOfEntry(self.references, (contextSymbolId, referencedSymbolId, referenceKind))
+
+
+	def recordReferenceLocation(self, referenceId, sourceRange):
+		self.addEntry(self.referenceLocations, (referenceId, sourceRange), sourceRange)
+
+
+	def recordReferenceIsAmbiguous(self, referenceId):
+		self.addEntry(self.ambiguousReferences, referenceId)
+
+
+	def recordReferenceToUnsolvedSymhol(self, contextSymbolId, referenceKind, sourceRange):
+		self.receivedCallCount += 1
+		key = (contextSymbolId, referenceKind, sourceRange)
+		entry = self.unsolvedReferences.get(key)
+		if entry is None:
+			entry = (sourceRange, self.getNextElementId())
+			self.unsolvedReferences[key] = entry
+		return entry[1]
+
+
+	def recordQualifierLocation(self, referencedSymbolId, sourceRange):
+		self.addEntry(self.qualifierLocations, (referencedSymbolId, sourceRange), sourceRange)
+
+
+	def recordFile(self, filePath):
+		return self.getIdOfEntry(self.files, filePath)
+
+
+	def recordFileLanguage(self, fileId, languageIdentifier):
+		self.addEntry(self.fileLanguages, fileId, languageIdentifier)
+
+
+	def recordLocalSymbol(self, name):
+		return self.getIdOfEntry(self.localSymbols, name)
+
+
+	def recordLocalSymbolLocation(self, localSymbolId, sourceRange):
+		self.addEntry(self.localSymbolLocations, (localSymbolId, sourceRange), sourceRange)
+
+
+	def recordAtomicSourceRange(self, sourceRange):
+		self.addEntry(self.atomicSourceRanges, sourceRange, sourceRange)
+
+
+	def recordError(self, message, fatal, sourceRange):
+		self.addEntry(self.errors, (message, fatal, sourceRange), sourceRange)
+
+
+# indices of the arguments of each client method that hold ids handed out by the client
+_idArgumentIndices = {
+	'recordSymbolDefinitionKind': (0,),
+	'recordSymbolKind': (0,),
+	'recordSymbolLocation': (0,),
+	'recordSymbolScopeLocation': (0,),
+	'recordSymbolSignatureLocation': (0,),
+	'recordReference': (0, 1),
+	'recordReferenceLocation': (0,),
+	'recordReferenceIsAmbiguous': (0,),
+	'recordReferenceToUnsolvedSymhol': (0,),
+	'recordQualifierLocation': (0,),
+	'recordFileLanguage': (0,),
+	'recordLocalSymbolLocation': (0,),
+}
+
+
+def replayRecords(records, client):
+	idMap = { 0: 0 }
+	for methodName, resultId, args in records:
+		idArgumentIndices = _idArgumentIndices.get(methodName)
+		if idArgumentIndices is not None:
+			args = list(args)
+			for i in idArgumentIndices:
+				args[i] = idMap.get(args[i], 0)
+		result = getattr(client, methodName)(*args)
+		if resultId is not None:
+			idMap[resultId] = result
+
+
+# The value types below are allocated for almost every indexed name, so they use slots (or a tuple) instead of an
+# instance dictionary. They are never modified after construction (apart from lazily cached strings).
+
+class SourceRange(collections.namedtuple('SourceRange', ['startLine', 'startColumn', 'endLine', 'endColumn'])):
+	__slots__ = ()
+
 	def toString(self):
 		return '[' + str(self.startLine) + ':' + str(self.startColumn) + '|' + str(self.endLine) + ':' + str(self.endColumn) + ']'
 
 
 class NameHierarchy():
+	__slots__ = ('nameElements', 'delimiter', 'serializedString', 'displayString')
 
 	unsolvedSymbolName = 'unsolved symbol' # this name should not collide with normal symbol name, because they cannot contain space characters
 
 	def __init__(self, nameElement, delimiter):
-		self.nameElements = []
 		if nameElement is not None:
-			self.nameElements.append(nameElement)
+			self.nameElements = (nameElement,)
+		else:
+			self.nameElements = ()
 		self.delimiter = delimiter
+		self.serializedString = None
+		self.displayString = None
+
 
 	def copy(self):
+		# Name elements are immutable, so the copy can share them with this hierarchy.
+		ret = NameHierarchy(None, self.delimiter)
+		ret.nameElements = self.nameElements
+		ret.serializedString = self.serializedString
+		ret.displayString = self.displayString
+		return ret
+
+
+	def copyAndAppend(self, nameElement):
 		ret = NameHierarchy(None, self.delimiter)
-		for nameElement in self.nameElements:
-			ret.nameElements.append(NameElement(nameElement.name, nameElement.prefix, nameElement.postfix))
+		ret.nameElements = self.nameElements + (nameElement,)
 		return ret
 
 
 	def serialize(self):
-		return json.dumps(self, cls=NameHierarchyEncoder)
+		# Produces the same output as "json.dumps(self, cls=NameHierarchyEncoder)" without going through the generic
+		# encoder. The result is kept, because the same symbol is usually recorded many times.
+		if self.serializedString is None:
+			self.serializedString = (
+				'{"name_delimiter": ' + _encodeJsonString(self.delimiter) + ', "name_elements": [' +
+				', '.join([nameElement.serialize() for nameElement in self.nameElements]) + ']}'
+			)
+		return self.serializedString
 
 
 	def getDisplayString(self):
-		displayString = ''
-		isFirst = True
-		for nameElement in self.nameElements:
-			if not isFirst:
-				displayString += self.delimiter
-			isFirst = False
-			if len(nameElement.prefix) > 0:
-				displayString += nameElement.prefix + ' '
-			displayString += nameElement.name
-			if len(nameElement.postfix) > 0:
-				displayString += nameElement.postfix
-		return displayString
+		if self.displayString is None:
+			self.displayString = self.delimiter.join([nameElement.getDisplayString() for nameElement in self.nameElements])
+		return self.displayString
 
 
 class NameElement:
+	__slots__ = ('name', 'prefix', 'postfix')
 
 	def __init__(self, name, prefix = '', postfix = ''):
 		self.name = name
@@ -1199,37 +2417,104 @@ class NameElement:
 		self.postfix = postfix
 
 
+	def serialize(self):
+		return (
+			'{"name": ' + _encodeJsonString(self.name) + ', "prefix": ' + _encodeJsonString(self.prefix) +
+			', "postfix": ' + _encodeJsonString(self.postfix) + '}'
+		)
+
+
+	def getDisplayString(self):
+		displayString = self.name
+		if len(self.prefix) > 0:
+			displayString = self.prefix + ' ' + displayString
+		if len(self.postfix) > 0:
+			displayString += self.postfix
+		return displayString
+
+
 class NameHierarchyEncoder(json.JSONEncoder):
 
 	def default(self, obj):
 		if isinstance(obj, NameHierarchy):
 			return {
 				'name_delimiter': obj.delimiter,
-				'name_elements': [nameElement.__dict__ for nameElement in obj.nameElements]
+				'name_elements': [
+					{ 'name': nameElement.name, 'prefix': nameElement.prefix, 'postfix': nameElement.postfix } for nameElement in obj.nameElements
+				]
 			}
 		# Let the base class default method raise the TypeError
 		return json.JSONEncoder.default(self, obj)
 
 
-def getNameHierarchyForUnsolvedSymbol():
-	return NameHierarchy(NameElement(NameHierarchy.unsolvedSymbolName), '')
-
-
-def isQualifierNode(node):
-	nextNode = getNext(node)
-	if nextNode is not None and nextNode.type == 'trailer':
-		nextNode = getNext(nextNode)
-	if nextNode is not None and nextNode.type == 'operator' and nextNode.value == '.':
-		return True
-	return False
+def traverseNodeIteratively(rootNode, beginVisitHandlers, endVisitHandlers, traverseHandlers, onTraverseNode = None):
+	# Traverses the tree below rootNode depth-first in source order using an explicit stack, so deeply nested code does
+	# not hit Python's recursion limit. Handlers are looked up by node type:
+	# - a begin visit handler is called before the children of the node are traversed, an end visit handler afterwards
+	# - a traverse handler replaces the default traversal of a node. It returns the list of actions that need to run for
+	#   that node in execution order. Each action is a pair of a callable and its argument. If the callable is None, the
+	#   argument is a node that will be traversed.
+	# onTraverseNode is called with each traversed node and its depth within the tree.
+	stack = [(None, rootNode, 0)]
+	while stack:
+		action, node, depth = stack.pop()
+		if action is not None:
+			action(node)
+			continue
+		if node is None:
+			continue
+
+		if onTraverseNode is not None:
+			onTraverseNode(node, depth)
+
+		nodeType = node.type
+		depth += 1
+
+		traverseHandler = traverseHandlers.get(nodeType)
+		if traverseHandler is not None:
+			for action, argument in reversed(traverseHandler(node)):
+				stack.append((action, argument, depth))
+			continue
+
+		beginVisitHandler = beginVisitHandlers.get(nodeType)
+		if beginVisitHandler is not None:
+			beginVisitHandler(node)
+
+		endVisitHandler = endVisitHandlers.get(nodeType)
+		if endVisitHandler is not None:
+			stack.append((endVisitHandler, node, depth))
+
+		children = getattr(node, 'children', None)
+		if children is not None:
+			for child in reversed(children):
+				stack.append((None, child, depth))
+
+
+def getTypeshedPaths(versionInfo):
+	# the directories of jedi's typeshed stubs for the standard library that apply to the given Python version
+	typeshedPath = os.path.join(os.path.dirname(os.path.abspath(jedi.__file__)), 'third_party', 'typeshed', 'stdlib')
+	directoryNames = []
+	if versionInfo.major == 2:
+		directoryNames.append('2')
+	if versionInfo.major == 2 or versionInfo.major == 3:
+		directoryNames.append('2and3')
+	if versionInfo.major == 3:
+		directoryNames.append('3')
+		if versionInfo.minor in [5, 6, 7]:
+			directoryNames.append('3.' + str(versionInfo.minor))
+	return [os.path.join(typeshedPath, d) for d in directoryNames]
+
+
+def getNameHierarchyFromNames(names, delimiter):
+	if not names:
+		return None
+	nameHierarchy = NameHierarchy(None, delimiter)
+	nameHierarchy.nameElements = tuple([NameElement(name) for name in names])
+	return nameHierarchy
 
 
-def isCallNode(node):
-	nextNode = getNext(node)
-	if nextNode is not None and nextNode.type == 'trailer':
-		if len(nextNode.children) >= 2 and nextNode.children[0].value == '(' and nextNode.children[-1].value == ')':
-			return True
-	return False
+def getNameHierarchyForUnsolvedSymbol():
+	return NameHierarchy(NameElement(NameHierarchy.unsolvedSymbolName), '')
 
 
 def getSourceRangeOfNode(node):
@@ -1238,6 +2523,285 @@ def getSourceRangeOfNode(node):
 	return SourceRange(startLine, startColumn + 1, endLine, endColumn)
 
 
+class ScopeIndex:
+	# Answers the questions about the ancestors of a node that are asked for almost every name with dictionary lookups.
+	# For each inner node that has been looked at, the context of its children is stored: the enclosing class or function
+	# definition and the closest node that has a name. Since the context of a node is derived from the context of its
+	# parent, each node of a tree is only looked at once. Leaves are not stored, which matters because parso hashes some
+	# leaves by their value.
+
+	_scopeTypes = ['classdef', 'funcdef']
+	_emptyContext = (None, None)
+
+	def __init__(self):
+		self.childContexts = {}
+
+
+	def getParentContext(self, node):
+		parentNode = node.parent
+		if parentNode is None:
+			return ScopeIndex._emptyContext
+
+		context = self.childContexts.get(parentNode)
+		if context is not None:
+			return context
+
+		nodesWithoutContext = []
+		while parentNode is not None and parentNode not in self.childContexts:
+			nodesWithoutContext.append(parentNode)
+			parentNode = parentNode.parent
+		context = self.childContexts[parentNode] if parentNode is not None else ScopeIndex._emptyContext
+
+		for parentNode in reversed(nodesWithoutContext):
+			scopeNode, namedNode = context
+			if parentNode.type in ScopeIndex._scopeTypes:
+				scopeNode = parentNode
+			for child in parentNode.children:
+				if child.type == 'name':
+					namedNode = parentNode
+					break
+			context = (scopeNode, namedNode)
+			self.childContexts[parentNode] = context
+		return context
+
+
+	def getParentScopeNode(self, node):
+		# the closest parent of type "classdef" or "funcdef"
+		if node is None:
+			return None
+		return self.getParentContext(node)[0]
+
+
+	def getNamedParentNode(self, node):
+		if node is None:
+			return None
+		if node.type == 'name' and node.parent is not None:
+			# the name of a named node is skipped
+			return self.getParentContext(node.parent)[1]
+		return self.getParentContext(node)[1]
+
+
+class NameTagIndex:
+	# Classifies all names of a tree in a single pass over its leaves. The classification depends on the leaf that
+	# follows a name and on the enclosing import statement, which are expensive to find for each name separately. Names
+	# that are not part of the indexed tree are classified on demand.
+
+	_followedByDot = 1
+	_followedByOpeningParenthesis = 2
+	_qualifier = 4 # followed by a "." that accesses a member of the name
+	_call = 8 # followed by an argument list
+	_inImportFrom = 16
+	_inImportName = 32
+
+	def __init__(self, rootNode):
+		self.rootNode = rootNode # keeps the ids of the names valid
+		self.nameTags = {}
+		if rootNode is None:
+			return
+
+		# The leaves are visited in source order using a stack of child iterators. The tags of a name are stored as soon
+		# as the following leaf is known.
+		nameTags = self.nameTags
+		pendingNameNode = None
+		pendingTags = 0
+		stack = [(iter(getattr(rootNode, 'children', [rootNode])), 0)]
+		while stack:
+			children, importTags = stack[-1]
+			for node in children:
+				if hasattr(node, 'children'):
+					nodeType = node.type
+					if nodeType == 'import_from':
+						importTags = NameTagIndex._inImportFrom
+					elif nodeType == 'import_name':
+						importTags = NameTagIndex._inImportName
+					stack.append((iter(node.children), importTags))
+					break
+
+				if pendingNameNode is not None:
+					if node.type == 'operator':
+						pendingTags |= getTagsOfLeafFollowingName(node)
+					nameTags[id(pendingNameNode)] = pendingTags
+					pendingNameNode = None
+				if node.type == 'name':
+					pendingNameNode = node
+					pendingTags = importTags
+			else:
+				stack.pop()
+
+		if pendingNameNode is not None:
+			nameTags[id(pendingNameNode)] = pendingTags
+
+
+	def getTags(self, nameNode):
+		tags = self.nameTags.get(id(nameNode))
+		if tags is None:
+			tags = getTagsOfLeafFollowingName(nameNode.get_next_leaf())
+			if getParentWithType(nameNode, 'import_from') is not None:
+				tags |= NameTagIndex._inImportFrom
+			elif getParentWithType(nameNode, 'import_name') is not None:
+				tags |= NameTagIndex._inImportName
+		return tags
+
+
+	def isCall(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._call != 0
+
+
+	def isQualifier(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._qualifier != 0
+
+
+	def isFollowedByDot(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._followedByDot != 0
+
+
+	def isFollowedByOpeningParenthesis(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._followedByOpeningParenthesis != 0
+
+
+	def isInImportFrom(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._inImportFrom != 0
+
+
+	def isInImportName(self, nameNode):
+		return self.getTags(nameNode) & NameTagIndex._inImportName != 0
+
+
+def getTagsOfLeafFollowingName(leaf):
+	# These rules look at the node that follows the name, which is the leaf itself unless the leaf is the first child of
+	# its parent (e.g. the "(" of a trailer). A name is a qualifier if it is followed by a dot, also if that dot starts a
+	# trailer, and a call if it is followed by a trailer that holds an argument list.
+	if leaf is None or leaf.type != 'operator':
+		return 0
+	if leaf.value == '.':
+		tags = NameTagIndex._followedByDot
+		if leaf.parent.type == 'trailer' or leaf.parent.children[0] is not leaf:
+			tags |= NameTagIndex._qualifier
+		return tags
+	if leaf.value == '(':
+		tags = NameTagIndex._followedByOpeningParenthesis
+		if leaf.parent.type == 'trailer':
+			lastNode = leaf.parent.children[-1]
+			if len(leaf.parent.children) >= 2 and lastNode.type == 'operator' and lastNode.value == ')':
+				tags |= NameTagIndex._call
+		return tags
+	return 0
+
+
+class LocalNameIndex:
+	# Settles the names that the shallow indexer classifies as local symbols, so they do not need to be resolved by jedi:
+	# a name within a function refers to a local symbol of that function if the function has bound it before by an
+	# assignment, a loop, a with statement or a parameter. Names that a function also binds in any other way (e.g. by an
+	# import or a nested definition) or declares global or nonlocal are left to jedi from then on, as well as all names
+	# within lambdas, comprehensions and class bodies. Since the names need to be looked at in the order of the source
+	# code, a name that is used before it is bound is left to jedi as well.
+
+	_plainBindingTypes = ['expr_stmt', 'for_stmt', 'with_stmt', 'param']
+	_comprehensionTypes = ['comp_for', 'sync_comp_for']
+	_comprehensionParentTypes = ['testlist_comp', 'dictorsetmaker', 'argument']
+
+	def __init__(self):
+		self.boundNames = {} # maps each function to the names it has bound so far (True if only bound in a plain way)
+
+
+	def getFunctionOfLocalName(self, nameNode):
+		# Returns the function that the name is a local symbol of, or None if the name cannot be settled without jedi.
+		parentNode = nameNode.parent
+		if parentNode.type in ['global_stmt', 'nonlocal_stmt']:
+			functionNode = LocalNameIndex.getFunctionOfScope(nameNode)
+			if functionNode is not None:
+				self.boundNames.setdefault(functionNode, {})[nameNode.value] = False
+			return None
+		if parentNode.type == 'trailer':
+			return None # the name of an attribute, e.g. "foo.bar"
+		if parentNode.type == 'argument' and parentNode.children[0] is nameNode and len(parentNode.children) > 1:
+			return None # the name of a keyword argument, e.g. "foo(bar=1)"
+
+		functionNode = LocalNameIndex.getFunctionOfScope(nameNode)
+		if functionNode is None:
+			return None
+
+		boundNames = self.boundNames.setdefault(functionNode, {})
+		definitionNode = nameNode.get_definition()
+		if definitionNode is not None:
+			isBoundPlainly = definitionNode.type in LocalNameIndex._plainBindingTypes and boundNames.get(nameNode.value, True)
+			boundNames[nameNode.value] = isBoundPlainly
+			return functionNode if isBoundPlainly else None
+		return functionNode if boundNames.get(nameNode.value, False) else None
+
+
+	@staticmethod
+	def getFunctionOfScope(nameNode):
+		# Returns the function whose scope the name belongs to, or None if that scope is not a function.
+		childNode = nameNode
+		parentNode = nameNode.parent
+		while parentNode is not None:
+			if parentNode.type == 'funcdef':
+				if childNode is parentNode.children[-1] or childNode.type == 'parameters':
+					return parentNode
+				if childNode is not parentNode.name:
+					return None # an annotation of the return value, which belongs to the enclosing scope
+			elif parentNode.type == 'classdef':
+				if childNode is not parentNode.name:
+					return None
+			elif parentNode.type == 'param':
+				if childNode is not parentNode.name:
+					return None # a default value or an annotation, which belong to the enclosing scope
+			elif parentNode.type in ['lambdef', 'file_input'] or parentNode.type in LocalNameIndex._comprehensionTypes:
+				return None
+			elif parentNode.type in LocalNameIndex._comprehensionParentTypes:
+				if any(c.type in LocalNameIndex._comprehensionTypes for c in parentNode.children):
+					return None
+			childNode = parentNode
+			parentNode = parentNode.parent
+		return None
+
+
+class ModulePathIndex:
+	# Finds the names of the module that a file belongs to. The module names are derived from the first directory on the
+	# sys.path that contains the file. These directories are stored in a tree of path components, so the directories
+	# that contain a file are found by walking along the components of its path instead of comparing the path to each
+	# directory.
+
+	def __init__(self, rootPaths):
+		self.rootNode = ({}, None) # maps path components to child nodes and stores the priority of a directory
+		for priority, rootPath in enumerate(rootPaths):
+			children = self.rootNode[0]
+			components = rootPath.rstrip(os.path.sep).split(os.path.sep)
+			for i, component in enumerate(components):
+				node = children.get(component)
+				if i == len(components) - 1:
+					if node is None:
+						node = ({}, priority)
+					elif node[1] is None:
+						node = (node[0], priority)
+					children[component] = node
+				elif node is None:
+					node = ({}, None)
+					children[component] = node
+				children = node[0]
+
+
+	def getModuleNames(self, filePath):
+		# "filePath" needs to be absolute and without extension
+		components = filePath.split(os.path.sep)
+		bestPriority = None
+		moduleNamesIndex = None
+		children = self.rootNode[0]
+		for i in range(len(components) - 1): # the file itself cannot be a directory on the sys.path
+			node = children.get(components[i])
+			if node is None:
+				break
+			if node[1] is not None and (bestPriority is None or node[1] < bestPriority):
+				bestPriority = node[1]
+				moduleNamesIndex = i + 1
+			children = node[0]
+
+		if moduleNamesIndex is None:
+			return None
+		return components[moduleNamesIndex:]
+
+
 def getNamedParentNode(node):
 	if node is None:
 		return None
@@ -1266,17 +2830,6 @@ def getParentWithType(node, type):
 	return getParentWithType(parentNode, type)
 
 
-def getParentWithTypeInList(node, typeList):
-	if node == None:
-		return None
-	parentNode = node.parent
-	if parentNode == None:
-		return None
-	if parentNode.type in typeList:
-		return parentNode
-	return getParentWithTypeInList(parentNode, typeList)
-
-
 def getFirstDirectChildWithType(node, type):
 	for c in node.children:
 		if c.type == type:
@@ -1290,18 +2843,3 @@ def getDirectChildrenWithType(node, type):
 		if c.type == type:
 			children.append(c)
 	return children
-
-
-def getNext(node):
-	if hasattr(node, 'children'):
-		for c in node.children:
-			return c
-
-	siblingSource = node
-	while siblingSource is not None and siblingSource.parent is not None:
-		sibling = siblingSource.get_next_sibling()
-		if sibling is not None:
-			return sibling
-		siblingSource = siblingSource.parent
-
-	return None
@@ -1,8 +1,17 @@
 import argparse
+import contextlib
+import fnmatch
+import hashlib
 import indexer
+import json
+import multiprocessing
 import shallow_indexer
 import os
+import socket
 import sourcetraildb as srctrl
+import stat
+import sys
+import time
 
 
 def main():
@@ -28,6 +37,215 @@ def main():
 	parserIndex.add_argument('--clear', help='clear the database before indexing', action='store_true', required=False)
 	parserIndex.add_argument('--verbose', help='enable verbose console output', action='store_true', required=False)
 	parserIndex.add_argument('--shallow', help='use a quick indexing mode that matches references by name and ignores most of the context', action='store_true', required=False)
+	parserIndex.add_argument(
+		'--hybrid',
+		help='use an indexing mode that records the local symbols of functions without resolving them and only resolves the remaining names '
+			'(ignored in shallow mode)',
+		action='store_true',
+		required=False
+	)
+	parserIndex.add_argument(
+		'--definition-cache-size',
+		help='maximum number of resolved source locations that are kept in memory while indexing (ignored in shallow mode)',
+		type=int,
+		default=indexer._defaultDefinitionCacheSize,
+		required=False
+	)
+	parserIndex.add_argument(
+		'--name-inference-budget',
+		help='maximum time in seconds that is spent on resolving a single name, names that take longer are recorded as unsolved (if not '
+			'specified the time is not limited, only enforced on Unix, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserIndex.add_argument(
+		'--file-inference-budget',
+		help='maximum time in seconds that is spent on resolving the names of a source file, the remaining names are recorded as unsolved '
+			'once it is used up (if not specified the time is not limited, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserIndex.add_argument(
+		'--parse-cache-path',
+		help='path to the directory that stores the parsed syntax trees of imported modules, so they are not parsed again by later runs or by other '
+			'worker processes (if not specified the cache directory of jedi is used)',
+		type=str,
+		required=False
+	)
+	parserIndex.add_argument(
+		'--parse-cache-size',
+		help='maximum size of the parsed syntax trees stored in the parse cache in megabytes, the least recently used ones are removed after indexing '
+			'(if not specified the size is not limited)',
+		type=int,
+		required=False
+	)
+	parserIndex.add_argument(
+		'--import-cache-path',
+		help='path to a file that stores which modules the imports of the indexed files resolve to, so they do not need to be resolved again by '
+			'later runs (ignored in shallow mode)',
+		type=str,
+		required=False
+	)
+
+	indexProjectCommandName = 'index-project'
+	parserIndexProject = subparsers.add_parser(
+		indexProjectCommandName,
+		help='Index all Python source files within a directory tree in a single run and store the indexed data to a Sourcetrail database file. Run "' +
+			indexProjectCommandName + ' -h" for more info on available arguments.'
+	)
+	parserIndexProject.add_argument('--root-directory-path', help='path to the root directory of the source files to index', type=str, required=True)
+	parserIndexProject.add_argument('--database-file-path', help='path to the generated Sourcetrail database file', type=str, required=True)
+	parserIndexProject.add_argument(
+		'--include',
+		help='glob pattern that is matched against the paths of the files relative to the root directory to decide which files are indexed (can be '
+			'provided multiple times, defaults to "*.py")',
+		type=str,
+		action='append',
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--exclude',
+		help='glob pattern that is matched against the paths of the files and directories relative to the root directory to decide which of them are '
+			'skipped (can be provided multiple times)',
+		type=str,
+		action='append',
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--environment-path',
+		help='path to the Python executable or the directory that contains the Python environment that should be used to resolve dependencies within the indexed source '
+			'code (if not specified the path to the currently used interpreter is used)',
+		type=str,
+		required=False
+	)
+	parserIndexProject.add_argument('--clear', help='clear the database before indexing', action='store_true', required=False)
+	parserIndexProject.add_argument(
+		'--incremental',
+		help='skip files that have neither changed themselves nor depend on modules that have changed since they were indexed into the database the '
+			'last time (data of these files is recorded again, but data that has been removed from a file stays in the database until it is indexed '
+			'using "--clear")',
+		action='store_true',
+		required=False
+	)
+	parserIndexProject.add_argument('--verbose', help='enable verbose console output', action='store_true', required=False)
+	parserIndexProject.add_argument('--shallow', help='use a quick indexing mode that matches references by name and ignores most of the context', action='store_true', required=False)
+	parserIndexProject.add_argument(
+		'--hybrid',
+		help='use an indexing mode that records the local symbols of functions without resolving them and only resolves the remaining names '
+			'(ignored in shallow mode)',
+		action='store_true',
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--definition-cache-size',
+		help='maximum number of resolved source locations that are kept in memory while indexing a file (ignored in shallow mode)',
+		type=int,
+		default=indexer._defaultDefinitionCacheSize,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--name-inference-budget',
+		help='maximum time in seconds that is spent on resolving a single name, names that take longer are recorded as unsolved (if not '
+			'specified the time is not limited, only enforced on Unix, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--file-inference-budget',
+		help='maximum time in seconds that is spent on resolving the names of a source file, the remaining names are recorded as unsolved '
+			'once it is used up (if not specified the time is not limited, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--parse-cache-path',
+		help='path to the directory that stores the parsed syntax trees of imported modules, so they are not parsed again by later runs or by other '
+			'worker processes (if not specified the cache directory of jedi is used)',
+		type=str,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--parse-cache-size',
+		help='maximum size of the parsed syntax trees stored in the parse cache in megabytes, the least recently used ones are removed after indexing '
+			'(if not specified the size is not limited)',
+		type=int,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--import-cache-path',
+		help='path to a file that stores which modules the imports of the indexed files resolve to, so they do not need to be resolved again by '
+			'later runs (ignored in shallow mode)',
+		type=str,
+		required=False
+	)
+	parserIndexProject.add_argument(
+		'--jobs',
+		help='number of worker processes that index files in parallel while the main process writes their results to the database (defaults to 1)',
+		type=int,
+		default=1,
+		required=False
+	)
+
+	serveCommandName = 'serve'
+	parserServe = subparsers.add_parser(
+		serveCommandName,
+		help='Keep running and index source files on request, so start-up costs are only paid once. Requests are read as newline-delimited JSON '
+			'from stdin or from a Unix domain socket. Run "' + serveCommandName + ' -h" for more info on available arguments and on the request format.',
+		description='Keep running and index source files on request. Each request is a single line of JSON, e.g. '
+			'{"source_file_path": "foo.py", "database_file_path": "foo.srctrldb", "environment_path": null, "shallow": false, "hybrid": false, "clear": false}. '
+			'Only "source_file_path" and "database_file_path" are required. Each request is answered by a single line of JSON that contains the '
+			'"status" ("ok" or "error"), an optional error "message" and the "duration_ms" of the request. The request {"command": "shutdown"} stops '
+			'the server. Console output of the indexer is written to stderr.'
+	)
+	parserServe.add_argument(
+		'--socket-path',
+		help='path of a Unix domain socket to listen on for requests (if not specified requests are read from stdin and answered on stdout)',
+		type=str,
+		required=False
+	)
+	parserServe.add_argument('--verbose', help='enable verbose console output', action='store_true', required=False)
+	parserServe.add_argument(
+		'--definition-cache-size',
+		help='maximum number of resolved source locations that are kept in memory while indexing a file (ignored in shallow mode)',
+		type=int,
+		default=indexer._defaultDefinitionCacheSize,
+		required=False
+	)
+	parserServe.add_argument(
+		'--name-inference-budget',
+		help='maximum time in seconds that is spent on resolving a single name, names that take longer are recorded as unsolved (if not '
+			'specified the time is not limited, only enforced on Unix, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserServe.add_argument(
+		'--file-inference-budget',
+		help='maximum time in seconds that is spent on resolving the names of a source file, the remaining names are recorded as unsolved '
+			'once it is used up (if not specified the time is not limited, ignored in shallow mode)',
+		type=float,
+		required=False
+	)
+	parserServe.add_argument(
+		'--parse-cache-path',
+		help='path to the directory that stores the parsed syntax trees of imported modules, so they are not parsed again by later runs or by other '
+			'worker processes (if not specified the cache directory of jedi is used)',
+		type=str,
+		required=False
+	)
+	parserServe.add_argument(
+		'--parse-cache-size',
+		help='maximum size of the parsed syntax trees stored in the parse cache in megabytes, the least recently used ones are removed after indexing '
+			'(if not specified the size is not limited)',
+		type=int,
+		required=False
+	)
+	parserServe.add_argument(
+		'--import-cache-path',
+		help='path to a file that stores which modules the imports of the indexed files resolve to, so they do not need to be resolved again by '
+			'later runs (ignored in shallow mode)',
+		type=str,
+		required=False
+	)
 
 	checkEnvironmentCommandName = 'check-environment'
 	parserCheckEnvironment = subparsers.add_parser(
@@ -46,6 +264,10 @@ def main():
 
 	if args.command == indexCommandName:
 		processIndexCommand(args)
+	elif args.command == indexProjectCommandName:
+		processIndexProjectCommand(args)
+	elif args.command == serveCommandName:
+		processServeCommand(args)
 	elif args.command == checkEnvironmentCommandName:
 		processCheckEnvironmentCommand(args)
 	else:
@@ -72,30 +294,663 @@ def processIndexCommand(args):
 	if environmentPath is not None and not os.path.isabs(environmentPath):
 		environmentPath = os.path.join(workingDirectory, environmentPath)
 
+	configureParseCache(args.parse_cache_path)
+	indexer.resetUsedParseCacheFiles()
+	loadImportCache(args.import_cache_path)
+
+	openDatabase(databaseFilePath, args.clear, args.verbose)
+
+	srctrl.beginTransaction()
+	indexSourceFile(
+		sourceFilePath, environmentPath, workingDirectory, args.verbose, args.shallow, args.definition_cache_size, args.name_inference_budget,
+		args.file_inference_budget, args.hybrid
+	)
+	srctrl.commitTransaction()
+
+	if not srctrl.close():
+		print('ERROR: ' + srctrl.getLastError())
+
+	updateParseCache(args.parse_cache_size, args.verbose)
+	storeImportCache(args.import_cache_path)
+	printHybridStatistics(args)
+
+
+def processIndexProjectCommand(args):
+	workingDirectory = os.getcwd()
+
+	if not indexer.isSourcetrailDBVersionCompatible(True):
+		return
+
+	databaseFilePath = args.database_file_path
+	if not os.path.isabs(databaseFilePath):
+		databaseFilePath = os.path.join(workingDirectory, databaseFilePath)
+
+	rootDirectoryPath = args.root_directory_path
+	if not os.path.isabs(rootDirectoryPath):
+		rootDirectoryPath = os.path.join(workingDirectory, rootDirectoryPath)
+	rootDirectoryPath = os.path.normpath(rootDirectoryPath) # discovered paths need to match the module paths reported by jedi
+
+	environmentPath = args.environment_path
+	if environmentPath is not None and not os.path.isabs(environmentPath):
+		environmentPath = os.path.join(workingDirectory, environmentPath)
+
+	includePatterns = args.include if args.include else ['*.py']
+	excludePatterns = args.exclude if args.exclude else []
+	sourceFilePaths = findSourceFiles(rootDirectoryPath, includePatterns, excludePatterns)
+
+	if args.verbose:
+		print('INFO: Found ' + str(len(sourceFilePaths)) + ' source files in "' + rootDirectoryPath + '".')
+
+	startTime = time.time()
+
+	# The manifest describes the state of each file at the time it was indexed into the database. It only stays valid as
+	# long as the database is not cleared or removed.
+	manifestFilePath = getManifestFilePath(databaseFilePath)
+	manifest = None
+	if not args.clear and os.path.exists(databaseFilePath):
+		manifest = loadManifest(manifestFilePath)
+	if manifest is None:
+		manifest = { 'files': {}, 'modules': {}, 'dependents': {} }
+
+	indexingIdentity = getIndexingIdentity(environmentPath, args.shallow, args.hybrid)
+	contentHashes = {}
+	for sourceFilePath in sourceFilePaths:
+		contentHashes[sourceFilePath] = getContentHash(sourceFilePath)
+
+	if args.incremental:
+		sourceFilePaths = getSourceFilePathsToReindex(manifest, sourceFilePaths, contentHashes, indexingIdentity)
+		print('INFO: ' + str(len(contentHashes) - len(sourceFilePaths)) + ' of ' + str(len(contentHashes)) + ' source files are up to date.')
+
+	configureParseCache(args.parse_cache_path)
+	indexer.resetUsedParseCacheFiles()
+	loadImportCache(args.import_cache_path)
+
+	openDatabase(databaseFilePath, args.clear, args.verbose)
+
+	srctrl.beginTransaction()
+	astVisitorClient = indexer.AstVisitorClient()
+	if args.jobs > 1:
+		(indexedFiles, failedFilePaths) = indexSourceFilesInParallel(sourceFilePaths, environmentPath, workingDirectory, astVisitorClient, args)
+	else:
+		(indexedFiles, failedFilePaths) = indexSourceFilesSequentially(sourceFilePaths, environmentPath, workingDirectory, astVisitorClient, args)
+	srctrl.commitTransaction()
+
+	if not srctrl.close():
+		print('ERROR: ' + srctrl.getLastError())
+
+	updateManifest(manifest, indexedFiles, failedFilePaths, contentHashes, indexingIdentity)
+	storeManifest(manifestFilePath, manifest)
+
+	updateParseCache(args.parse_cache_size, args.verbose)
+	storeImportCache(args.import_cache_path)
+
+	printThroughput(len(indexedFiles), time.time() - startTime)
+	printHybridStatistics(args)
+
+
+def getManifestFilePath(databaseFilePath):
+	return os.path.splitext(databaseFilePath)[0] + '.manifest.json'
+
+
+def loadManifest(manifestFilePath):
+	try:
+		with open(manifestFilePath, 'r', encoding='utf-8') as input:
+			manifest = json.load(input)
+	except Exception:
+		return None
+	for key in ['files', 'modules', 'dependents']:
+		manifest.setdefault(key, {})
+	return manifest
+
+
+def storeManifest(manifestFilePath, manifest):
+	try:
+		indexer.writeJsonFileAtomically(manifestFilePath, manifest)
+	except Exception as e:
+		print('WARNING: Unable to store manifest file "' + manifestFilePath + '" (details: "' + str(e) + '").')
+
+
+def getIndexingIdentity(environmentPath, shallow, hybrid):
+	# Files need to be indexed again whenever the environment that is used to resolve their dependencies or the indexer
+	# itself changes.
+	if shallow:
+		environmentIdentity = 'shallow'
+	else:
+		environment = indexer.getEnvironment(environmentPath)
+		environmentIdentity = environment.executable + ' ' + '.'.join(str(i) for i in environment.version_info)
+		if hybrid:
+			environmentIdentity += ' hybrid'
+	return {
+		'environment': environmentIdentity,
+		'indexer_version': indexer.__version__
+	}
+
+
+def getContentHash(sourceFilePath):
+	hash = hashlib.sha256()
+	with open(sourceFilePath, 'rb') as input:
+		hash.update(input.read())
+	return hash.hexdigest()
+
+
+def getSourceFilePathsToReindex(manifest, sourceFilePaths, contentHashes, indexingIdentity):
+	changedModulePaths = set()
+	for modulePath, fingerprint in manifest['modules'].items():
+		# modules without fingerprint have been modified while the files that depend on them were indexed
+		if fingerprint is None or indexer.getFileFingerprint(modulePath) != fingerprint:
+			changedModulePaths.add(modulePath)
+
+	sourceFilePathsToReindex = set()
+	addedModulePaths = {}
+	for sourceFilePath in sourceFilePaths:
+		if (
+			not isUpToDateInManifest(manifest, sourceFilePath, contentHashes[sourceFilePath], indexingIdentity) or
+			hasAddedModuleForUnresolvedImport(manifest, sourceFilePath, addedModulePaths)
+		):
+			sourceFilePathsToReindex.add(sourceFilePath)
+			changedModulePaths.add(sourceFilePath)
+
+	# the indexed data of a file needs to be updated if any module that it depends on (directly or transitively) changed
+	modulePathsToVisit = list(changedModulePaths)
+	visitedModulePaths = set(changedModulePaths)
+	while modulePathsToVisit:
+		modulePath = modulePathsToVisit.pop()
+		for dependentPath in manifest['dependents'].get(modulePath, []):
+			sourceFilePathsToReindex.add(dependentPath)
+			if dependentPath not in visitedModulePaths:
+				visitedModulePaths.add(dependentPath)
+				modulePathsToVisit.append(dependentPath)
+
+	return [p for p in sourceFilePaths if p in sourceFilePathsToReindex]
+
+
+def hasAddedModuleForUnresolvedImport(manifest, sourceFilePath, addedModulePaths):
+	# "addedModulePaths" caches the result for each path, since many files tend to share the same unresolved imports
+	entry = manifest['files'].get(sourceFilePath)
+	if entry is None:
+		return False
+	for path in entry.get('unresolved_imports', []):
+		if path not in addedModulePaths:
+			addedModulePaths[path] = indexer.isModulePath(path)
+		if addedModulePaths[path]:
+			return True
+	return False
+
+
+def updateManifest(manifest, indexedFiles, failedFilePaths, contentHashes, indexingIdentity):
+	moduleFingerprints = {}
+	for sourceFilePath, indexedFileInfo in indexedFiles:
+		manifest['files'][sourceFilePath] = {
+			'content_hash': contentHashes[sourceFilePath],
+			'environment': indexingIdentity['environment'],
+			'indexer_version': indexingIdentity['indexer_version'],
+			'dependencies': sorted(indexedFileInfo['dependencies']),
+			'unresolved_imports': indexedFileInfo['unresolved_imports']
+		}
+		for dependencyPath, fingerprint in indexedFileInfo['dependencies'].items():
+			if moduleFingerprints.get(dependencyPath, fingerprint) != fingerprint:
+				fingerprint = None # the module has been modified between indexing two of the files that depend on it
+			moduleFingerprints[dependencyPath] = fingerprint
+	manifest['modules'].update(moduleFingerprints)
+
+	# the data of these files is incomplete, so they are indexed again by the next incremental run
+	for sourceFilePath in failedFilePaths:
+		manifest['files'].pop(sourceFilePath, None)
+
+	updateDependentsInManifest(manifest)
+
+
+def getIndexedFileInfo(dependencyPaths, unresolvedImportPaths, indexingStartTime):
+	# The fingerprints of the dependencies need to describe the state that has been indexed. A dependency that has not
+	# been modified since indexing of the file started still has that state. Any other dependency may have been read in
+	# either state, so it gets no fingerprint and counts as changed in the next incremental run.
+	dependencies = {}
+	for dependencyPath in dependencyPaths:
+		fingerprint = indexer.getFileFingerprint(dependencyPath)
+		if fingerprint is not None and fingerprint[0] >= indexingStartTime:
+			fingerprint = None
+		dependencies[dependencyPath] = fingerprint
+	return {
+		'dependencies': dependencies,
+		'unresolved_imports': sorted(unresolvedImportPaths)
+	}
+
+
+def updateDependentsInManifest(manifest):
+	# the reverse dependency graph is stored as well, so it does not need to be computed when loading the manifest
+	dependents = {}
+	for sourceFilePath, entry in manifest['files'].items():
+		for dependencyPath in entry.get('dependencies', []):
+			dependents.setdefault(dependencyPath, []).append(sourceFilePath)
+	for dependencyPath in dependents:
+		dependents[dependencyPath].sort()
+	manifest['dependents'] = dependents
+	manifest['modules'] = dict((p, f) for p, f in manifest['modules'].items() if p in dependents)
+
+
+def isUpToDateInManifest(manifest, sourceFilePath, contentHash, indexingIdentity):
+	entry = manifest['files'].get(sourceFilePath)
+	if entry is None:
+		return False
+	return (
+		entry.get('content_hash') == contentHash and
+		entry.get('environment') == indexingIdentity['environment'] and
+		entry.get('indexer_version') == indexingIdentity['indexer_version']
+	)
+
+
+def indexSourceFilesSequentially(sourceFilePaths, environmentPath, workingDirectory, astVisitorClient, args):
+	# All files are indexed using the same environment, project and database connection. These are the things that are
+	# expensive to set up when running the indexer for each file separately.
+	environment = None
+	project = None
+	if not args.shallow:
+		environment = indexer.getEnvironment(environmentPath)
+		project = indexer.jedi.api.project.Project(workingDirectory, environment_path = environment.path)
+
+	bufferedAstVisitorClient = indexer.BufferedAstVisitorClient(astVisitorClient)
+	indexedFiles = []
+	failedFilePaths = []
+	for sourceFilePath in sourceFilePaths:
+		startTime = time.time()
+		try:
+			dependencyPaths = set()
+			unresolvedImportPaths = set()
+			if args.shallow:
+				shallow_indexer.indexSourceFile(sourceFilePath, environmentPath, workingDirectory, bufferedAstVisitorClient, args.verbose)
+			else:
+				(dependencyPaths, unresolvedImportPaths) = indexer.indexSourceFile(
+					sourceFilePath, environmentPath, workingDirectory, bufferedAstVisitorClient, args.verbose, args.definition_cache_size, environment, project,
+					args.name_inference_budget, args.file_inference_budget, args.hybrid
+				)
+			bufferedAstVisitorClient.flush()
+			indexedFiles.append((sourceFilePath, getIndexedFileInfo(dependencyPaths, unresolvedImportPaths, startTime)))
+		except Exception as e:
+			print('ERROR: Encountered exception "' + e.__repr__() + '" while indexing source file "' + sourceFilePath + '".')
+			# the data recorded so far is incomplete, the file is indexed again by the next incremental run instead
+			bufferedAstVisitorClient.clear()
+			failedFilePaths.append(sourceFilePath)
+		finally:
+			indexer.markUsedParseCacheFiles()
+	if args.verbose:
+		printSavedCallCount(bufferedAstVisitorClient)
+	return (indexedFiles, failedFilePaths)
+
+
+def indexSourceFilesInParallel(sourceFilePaths, environmentPath, workingDirectory, astVisitorClient, args):
+	# The worker processes only record the indexed data. This process is the only one that writes to the database by
+	# replaying these records file by file as soon as they arrive.
+	indexedFiles = []
+	failedFilePaths = []
+	with multiprocessing.Pool(
+		processes=args.jobs,
+		initializer=initializeWorker,
+		initargs=(
+			environmentPath, workingDirectory, args.verbose, args.shallow, args.hybrid, args.definition_cache_size, args.name_inference_budget,
+			args.file_inference_budget, args.parse_cache_path, args.import_cache_path
+		)
+	) as pool:
+		for sourceFilePath, records, indexedFileInfo, importCacheEntries, hybridStatistics, errorMessage in pool.imap_unordered(
+			indexSourceFileInWorker, sourceFilePaths
+		):
+			# imports resolved by one worker are not shared with the other workers, but they are stored for later runs
+			indexer.addImportCacheEntries(importCacheEntries)
+			indexer.addHybridStatistics(hybridStatistics)
+			if errorMessage is not None:
+				print('ERROR: Encountered exception "' + errorMessage + '" while indexing source file "' + sourceFilePath + '".')
+				failedFilePaths.append(sourceFilePath)
+				continue
+			indexer.replayRecords(records, astVisitorClient)
+			indexedFiles.append((sourceFilePath, indexedFileInfo))
+	return (indexedFiles, failedFilePaths)
+
+
+_workerState = None
+
+
+def initializeWorker(
+	environmentPath, workingDirectory, verbose, shallow, hybrid, definitionCacheSize, nameInferenceBudget, fileInferenceBudget, parseCachePath,
+	importCachePath
+):
+	global _workerState
+
+	configureParseCache(parseCachePath)
+	loadImportCache(importCachePath)
+
+	environment = None
+	project = None
+	if not shallow:
+		environment = indexer.getEnvironment(environmentPath)
+		project = indexer.jedi.api.project.Project(workingDirectory, environment_path = environment.path)
+
+	_workerState = {
+		'environment_path': environmentPath,
+		'working_directory': workingDirectory,
+		'verbose': verbose,
+		'shallow': shallow,
+		'hybrid': hybrid,
+		'definition_cache_size': definitionCacheSize,
+		'name_inference_budget': nameInferenceBudget,
+		'file_inference_budget': fileInferenceBudget,
+		'environment': environment,
+		'project': project
+	}
+
+
+def indexSourceFileInWorker(sourceFilePath):
+	# Buffering the records before they are sent to the main process reduces both the amount of data that needs to be
+	# transferred and the number of database calls that need to be made when replaying them.
+	astVisitorClient = indexer.RecordingAstVisitorClient()
+	bufferedAstVisitorClient = indexer.BufferedAstVisitorClient(astVisitorClient)
+	dependencyPaths = set()
+	unresolvedImportPaths = set()
+	startTime = time.time()
+	try:
+		if _workerState['shallow']:
+			shallow_indexer.indexSourceFile(
+				sourceFilePath, _workerState['environment_path'], _workerState['working_directory'], bufferedAstVisitorClient, _workerState['verbose']
+			)
+		else:
+			(dependencyPaths, unresolvedImportPaths) = indexer.indexSourceFile(
+				sourceFilePath,
+				_workerState['environment_path'],
+				_workerState['working_directory'],
+				bufferedAstVisitorClient,
+				_workerState['verbose'],
+				_workerState['definition_cache_size'],
+				_workerState['environment'],
+				_workerState['project'],
+				_workerState['name_inference_budget'],
+				_workerState['file_inference_budget'],
+				_workerState['hybrid']
+			)
+		bufferedAstVisitorClient.flush()
+	except Exception as e:
+		return (sourceFilePath, None, None, indexer.takeNewImportCacheEntries(), indexer.takeHybridStatistics(), e.__repr__())
+	finally:
+		indexer.markUsedParseCacheFiles()
+	if _workerState['verbose']:
+		printSavedCallCount(bufferedAstVisitorClient)
+	return (
+		sourceFilePath,
+		astVisitorClient.records,
+		getIndexedFileInfo(dependencyPaths, unresolvedImportPaths, startTime),
+		indexer.takeNewImportCacheEntries(),
+		indexer.takeHybridStatistics(),
+		None
+	)
+
+
+def processServeCommand(args):
+	if not indexer.isSourcetrailDBVersionCompatible(True):
+		return
+
+	configureParseCache(args.parse_cache_path)
+	loadImportCache(args.import_cache_path)
+	try:
+		serveRequests(args)
+	finally:
+		storeImportCache(args.import_cache_path)
+
+
+def serveRequests(args):
+	server = IndexServer(
+		os.getcwd(), args.verbose, args.definition_cache_size, args.parse_cache_size, args.name_inference_budget, args.file_inference_budget
+	)
+
+	if args.socket_path is None:
+		for line in sys.stdin:
+			response = server.handleRequest(line)
+			if response is not None:
+				sys.stdout.write(json.dumps(response) + '\n')
+				sys.stdout.flush()
+			if server.isShutdownRequested:
+				break
+		return
+
+	if not hasattr(socket, 'AF_UNIX'):
+		print('ERROR: Unix domain sockets are not supported on this platform.')
+		return
+
+	if not removeStaleSocket(args.socket_path):
+		return
+
+	serverSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	socketFileId = None
+	try:
+		serverSocket.bind(args.socket_path)
+		socketFileId = getFileId(args.socket_path)
+		serverSocket.listen(1)
+		while not server.isShutdownRequested:
+			connection, address = serverSocket.accept()
+			with connection, connection.makefile('r', encoding='utf-8') as input, connection.makefile('w', encoding='utf-8') as output:
+				for line in input:
+					response = server.handleRequest(line)
+					if response is not None:
+						output.write(json.dumps(response) + '\n')
+						output.flush()
+					if server.isShutdownRequested:
+						break
+	finally:
+		serverSocket.close()
+		# another server may have replaced the socket file in the meantime
+		if socketFileId is not None and getFileId(args.socket_path) == socketFileId:
+			os.remove(args.socket_path)
+
+
+def removeStaleSocket(socketPath):
+	# Removes the socket file that a server which did not shut down properly has left behind. Returns False if the path
+	# is in use by something else, which is either not a socket or a socket that another server is still listening on.
+	try:
+		mode = os.stat(socketPath).st_mode
+	except FileNotFoundError:
+		return True
+
+	if not stat.S_ISSOCK(mode):
+		print('ERROR: The socket path "' + socketPath + '" already exists and is not a socket.')
+		return False
+
+	clientSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		clientSocket.connect(socketPath)
+		print('ERROR: Another server is already listening on socket "' + socketPath + '".')
+		return False
+	except OSError:
+		pass # nobody is listening anymore
+	finally:
+		clientSocket.close()
+
+	os.remove(socketPath)
+	return True
+
+
+def getFileId(filePath):
+	try:
+		fileStat = os.stat(filePath)
+		return (fileStat.st_dev, fileStat.st_ino)
+	except OSError:
+		return None
+
+
+class IndexServer:
+	# Handles index requests within a long running process. Python environments and their jedi projects are kept
+	# across requests, as well as parso's in-memory cache of parsed modules, which is invalidated whenever a module
+	# file changes. The inference state of each indexed file is still set up from scratch, because jedi would not
+	# notice that a module has changed between two requests otherwise.
+
+	def __init__(self, workingDirectory, verbose, definitionCacheSize, parseCacheSize = None, nameInferenceBudget = None, fileInferenceBudget = None):
+		self.workingDirectory = workingDirectory
+		self.verbose = verbose
+		self.definitionCacheSize = definitionCacheSize
+		self.parseCacheSize = parseCacheSize
+		self.nameInferenceBudget = nameInferenceBudget
+		self.fileInferenceBudget = fileInferenceBudget
+		self.environments = {}
+		self.isShutdownRequested = False
+
+
+	def handleRequest(self, line):
+		line = line.strip()
+		if not line:
+			return None
+
+		startTime = time.time()
+		response = {}
+		try:
+			request = json.loads(line)
+			if request.get('command') == 'shutdown':
+				self.isShutdownRequested = True
+				response['status'] = 'ok'
+			else:
+				response['source_file_path'] = request.get('source_file_path')
+				# the indexer writes its messages to stdout, which may be used for responses
+				with contextlib.redirect_stdout(sys.stderr):
+					self.processIndexRequest(request)
+				response['status'] = 'ok'
+		except Exception as e:
+			response['status'] = 'error'
+			response['message'] = e.__repr__()
+
+		response['duration_ms'] = round((time.time() - startTime) * 1000, 1)
+		if self.verbose:
+			sys.stderr.write('INFO: Handled request in ' + str(response['duration_ms']) + ' ms.\n')
+		return response
+
+
+	def processIndexRequest(self, request):
+		sourceFilePath = self.getAbsolutePath(request['source_file_path'])
+		databaseFilePath = self.getAbsolutePath(request['database_file_path'])
+		environmentPath = request.get('environment_path')
+		if environmentPath is not None:
+			environmentPath = self.getAbsolutePath(environmentPath)
+		shallow = request.get('shallow', False)
+		hybrid = request.get('hybrid', False)
+
+		indexer.resetUsedParseCacheFiles()
+		openDatabase(databaseFilePath, request.get('clear', False), self.verbose)
+		try:
+			srctrl.beginTransaction()
+			astVisitorClient = indexer.BufferedAstVisitorClient(indexer.AstVisitorClient())
+			if shallow:
+				shallow_indexer.indexSourceFile(sourceFilePath, environmentPath, self.workingDirectory, astVisitorClient, self.verbose)
+			else:
+				(environment, project) = self.getEnvironmentAndProject(environmentPath)
+				indexer.indexSourceFile(
+					sourceFilePath, environmentPath, self.workingDirectory, astVisitorClient, self.verbose, self.definitionCacheSize, environment, project,
+					self.nameInferenceBudget, self.fileInferenceBudget, hybrid
+				)
+			astVisitorClient.flush()
+			srctrl.commitTransaction()
+		except Exception:
+			srctrl.rollbackTransaction()
+			raise
+		finally:
+			if not srctrl.close():
+				print('ERROR: ' + srctrl.getLastError())
+			updateParseCache(self.parseCacheSize, self.verbose)
+
+
+	def getEnvironmentAndProject(self, environmentPath):
+		if environmentPath not in self.environments:
+			environment = indexer.getEnvironment(environmentPath)
+			project = indexer.jedi.api.project.Project(self.workingDirectory, environment_path = environment.path)
+			self.environments[environmentPath] = (environment, project)
+		return self.environments[environmentPath]
+
+
+	def getAbsolutePath(self, path):
+		if not os.path.isabs(path):
+			return os.path.join(self.workingDirectory, path)
+		return path
+
+
+def configureParseCache(parseCachePath):
+	if parseCachePath is not None:
+		indexer.configureParseCache(parseCachePath)
+
+
+def loadImportCache(importCachePath):
+	if importCachePath is not None:
+		indexer.loadImportCache(importCachePath)
+
+
+def storeImportCache(importCachePath):
+	if importCachePath is not None:
+		indexer.storeImportCache(importCachePath)
+
+
+def updateParseCache(parseCacheSize, verbose):
+	indexer.markUsedParseCacheFiles()
+	if parseCacheSize is not None:
+		indexer.pruneParseCache(parseCacheSize * 1024 * 1024, verbose)
+
+
+def openDatabase(databaseFilePath, clear, verbose):
 	if not srctrl.open(databaseFilePath):
 		print('ERROR: ' + srctrl.getLastError())
 
-	if args.clear:
-		if args.verbose:
+	if clear:
+		if verbose:
 			print('INFO: Clearing database...')
 		if not srctrl.clear():
 			print('ERROR: ' + srctrl.getLastError())
 		else:
-			if args.verbose:
+			if verbose:
 				print('INFO: Clearing done.')
 
-	if args.verbose:
+	if verbose:
 		if srctrl.isEmpty():
 			print('INFO: Loaded database is empty.')
 		else:
 			print('INFO: Loaded database contains data.')
 
-	srctrl.beginTransaction()
-	indexSourceFile(sourceFilePath, environmentPath, workingDirectory, args.verbose, args.shallow)
-	srctrl.commitTransaction()
 
-	if not srctrl.close():
-		print('ERROR: ' + srctrl.getLastError())
+def findSourceFiles(rootDirectoryPath, includePatterns, excludePatterns):
+	sourceFilePaths = []
+	for directoryPath, directoryNames, fileNames in os.walk(rootDirectoryPath):
+		relativeDirectoryPath = os.path.relpath(directoryPath, rootDirectoryPath)
+		if relativeDirectoryPath == '.':
+			relativeDirectoryPath = ''
+
+		# skipping excluded directories here prevents walking into them at all
+		directoryNames[:] = sorted(d for d in directoryNames if not matchesAnyPattern(joinRelativePath(relativeDirectoryPath, d), excludePatterns))
+
+		for fileName in sorted(fileNames):
+			relativeFilePath = joinRelativePath(relativeDirectoryPath, fileName)
+			if matchesAnyPattern(relativeFilePath, includePatterns) and not matchesAnyPattern(relativeFilePath, excludePatterns):
+				sourceFilePaths.append(os.path.join(directoryPath, fileName))
+	return sourceFilePaths
+
+
+def joinRelativePath(relativeDirectoryPath, name):
+	# patterns always use "/" as separator, independent of the platform
+	if not relativeDirectoryPath:
+		return name
+	return relativeDirectoryPath.replace(os.path.sep, '/') + '/' + name
+
+
+def matchesAnyPattern(relativePath, patterns):
+	for pattern in patterns:
+		if fnmatch.fnmatch(relativePath, pattern):
+			return True
+	return False
+
+
+def printThroughput(indexedFileCount, duration):
+	filesPerSecond = indexedFileCount / duration if duration > 0 else 0.0
+	print('INFO: Indexed ' + str(indexedFileCount) + ' files in ' + '{:.2f}'.format(duration) + ' seconds (' + '{:.2f}'.format(filesPerSecond) + ' files/sec).')
+
+
+def printHybridStatistics(args):
+	if args.hybrid and not args.shallow:
+		print('INFO: Hybrid indexing: ' + indexer.getHybridStatisticsString() + '.')
+
+
+def printSavedCallCount(bufferedAstVisitorClient):
+	print(
+		'INFO: Forwarded ' + str(bufferedAstVisitorClient.forwardedCallCount) + ' of ' + str(bufferedAstVisitorClient.receivedCallCount) +
+		' recorded calls to the database (' + str(bufferedAstVisitorClient.getSavedCallCount()) + ' saved).'
+	)
 
 
 def processCheckEnvironmentCommand(args):
@@ -112,14 +967,21 @@ def processCheckEnvironmentCommand(args):
 		print('The provided path is not a valid Python environment: ' + message)
 
 
-def indexSourceFile(sourceFilePath, environmentPath, workingDirectory, verbose, shallow):
+def indexSourceFile(sourceFilePath, environmentPath, workingDirectory, verbose, shallow, definitionCacheSize, nameInferenceBudget, fileInferenceBudget, hybrid):
 	if shallow:
-		astVisitorClient = shallow_indexer.AstVisitorClient()
+		astVisitorClient = indexer.BufferedAstVisitorClient(shallow_indexer.AstVisitorClient())
 		shallow_indexer.indexSourceFile(sourceFilePath, environmentPath, workingDirectory, astVisitorClient, verbose)
 	else:
-		astVisitorClient = indexer.AstVisitorClient()
-		indexer.indexSourceFile(sourceFilePath, environmentPath, workingDirectory, astVisitorClient, verbose)
+		astVisitorClient = indexer.BufferedAstVisitorClient(indexer.AstVisitorClient())
+		indexer.indexSourceFile(
+			sourceFilePath, environmentPath, workingDirectory, astVisitorClient, verbose, definitionCacheSize,
+			nameInferenceBudget = nameInferenceBudget, fileInferenceBudget = fileInferenceBudget, hybrid = hybrid
+		)
+	astVisitorClient.flush()
+	if verbose:
+		printSavedCallCount(astVisitorClient)
 
 
 if __name__ == '__main__':
+	multiprocessing.freeze_support() # required for running worker processes from a frozen executable on Windows
 	main()
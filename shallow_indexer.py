@@ -13,6 +13,11 @@ from indexer import SourceRange
 from indexer import NameHierarchy
 from indexer import NameElement
 from indexer import NameHierarchyEncoder
+from indexer import getNameHierarchyFromNames
+from indexer import traverseNodeIteratively
+from indexer import ScopeIndex
+from indexer import NameTagIndex
+from indexer import ModulePathIndex
 
 
 _virtualFilePath = 'virtual_file.py'
@@ -74,6 +79,7 @@ class ContextType(Enum):
 
 
 class ContextInfo:
+	__slots__ = ('id', 'name', 'node', 'selfParamName', 'localSymbolNames', 'contextType')
 
 	def __init__(self, id, contextType, name, node):
 		self.id = id
@@ -115,9 +121,14 @@ class AstVisitor:
 #			baseSysPath.sort(reverse=True)
 #			self.sysPath.extend(baseSysPath)
 		self.sysPath = list(filter(None, self.sysPath))
+		self.modulePathIndex = ModulePathIndex(self.sysPath)
+		self.moduleNameHierarchyCache = {}
 
 		self.contextStack = []
+		self.scopeIndex = ScopeIndex()
+		self.nameTagIndex = NameTagIndex(None)
 		self.referenceKindStack = []
+		self.suspendedReferenceKindStack = []
 
 		fileId = self.client.recordFile(self.sourceFilePath)
 		if fileId == 0:
@@ -133,93 +144,71 @@ class AstVisitor:
 			self.contextStack.append(ContextInfo(moduleId, ContextType.MODULE, moduleNameHierarchy.getDisplayString(), None))
 
 
-	def traverseNode(self, node):
-		if node is None:
-			return
-
-		if node.type == 'classdef':
-			self.traverseClassdef(node)
-		elif node.type == 'funcdef':
-			self.traverseFuncdef(node)
-		elif node.type == 'param':
-			self.traverseParam(node)
-		elif node.type == 'argument':
-			self.traverseArgument(node)
-		elif node.type == 'import_from':
-			self.traverseImportFrom(node)
-		elif node.type == 'dotted_as_name':
-			self.traverseDottedAsNameOrImportAsName(node)
-		elif node.type == 'import_as_name':
-			self.traverseDottedAsNameOrImportAsName(node)
-		else:
-			if node.type == 'name':
-				self.beginVisitName(node)
-			elif node.type == 'string':
-				self.beginVisitString(node)
-			elif node.type == 'error_leaf':
-				self.beginVisitErrorLeaf(node)
-			elif node.type == 'import_name':
-				self.beginVisitImportName(node)
-
-			if hasattr(node, 'children'):
-				for c in node.children:
-					self.traverseNode(c)
-
-			if node.type == 'name':
-				self.endVisitName(node)
-			elif node.type == 'string':
-				self.endVisitString(node)
-			elif node.type == 'error_leaf':
-				self.endVisitErrorLeaf(node)
-			elif node.type == 'import_name':
-				self.endVisitImportName(node)
+	def traverseNode(self, node, onTraverseNode = None):
+		self.nameTagIndex = NameTagIndex(node)
+		traverseNodeIteratively(
+			node,
+			{
+				'name': self.beginVisitName,
+				'string': self.beginVisitString,
+				'error_leaf': self.beginVisitErrorLeaf,
+				'import_name': self.beginVisitImportName
+			},
+			{
+				'name': self.endVisitName,
+				'string': self.endVisitString,
+				'error_leaf': self.endVisitErrorLeaf,
+				'import_name': self.endVisitImportName
+			},
+			{
+				'classdef': self.traverseClassdef,
+				'funcdef': self.traverseFuncdef,
+				'param': self.traverseParam,
+				'argument': self.traverseArgument,
+				'import_from': self.traverseImportFrom,
+				'dotted_as_name': self.traverseDottedAsNameOrImportAsName,
+				'import_as_name': self.traverseDottedAsNameOrImportAsName
+			},
+			onTraverseNode
+		)
 
 #----------------
 
-	def traverseClassdef(self, node):
-		if node is None:
-			return
+	# The traverse methods below return the actions that are run for a node in execution order (see
+	# "traverseNodeIteratively"). An action of None traverses the respective node.
 
+	def traverseClassdef(self, node):
 		self.beginVisitClassdef(node)
 
+		actions = []
 		superArglist = node.get_super_arglist()
 		if superArglist is not None:
-			self.beginVisitClassdefSuperArglist(superArglist)
-			self.traverseNode(superArglist)
-			self.endVisitClassdefSuperArglist(superArglist)
-		self.traverseNode(node.get_suite())
-
-		self.endVisitClassdef(node)
+			actions.append((self.beginVisitClassdefSuperArglist, superArglist))
+			actions.append((None, superArglist))
+			actions.append((self.endVisitClassdefSuperArglist, superArglist))
+		actions.append((None, node.get_suite()))
+		actions.append((self.endVisitClassdef, node))
+		return actions
 
 
 	def traverseFuncdef(self, node):
-		if node is None:
-			return
-
 		self.beginVisitFuncdef(node)
 
+		actions = []
 		for n in node.get_params():
-			self.traverseNode(n)
-		self.traverseNode(node.get_suite())
-
-		self.endVisitFuncdef(node)
+			actions.append((None, n))
+		actions.append((None, node.get_suite()))
+		actions.append((self.endVisitFuncdef, node))
+		return actions
 
 
 	def traverseParam(self, node):
-		if node is None:
-			return
-
 		self.beginVisitParam(node)
 
-		self.traverseNode(node.default)
-
-		self.endVisitParam(node)
+		return [(None, node.default), (self.endVisitParam, node)]
 
 
 	def traverseArgument(self, node):
-		if node is None:
-			return
-
 		childTraverseStartIndex = 0
 
 		for i in range(len(node.children)):
@@ -227,46 +216,39 @@ class AstVisitor:
 				childTraverseStartIndex = i + 1
 				break
 
-		for i in range(childTraverseStartIndex, len(node.children)):
-			self.traverseNode(node.children[i])
+		return [(None, c) for c in node.children[childTraverseStartIndex:]]
 
 
 	def traverseImportFrom(self, node):
-		if node is None:
-			return
-
+		actions = []
 		referenceKindAdded = False
 
 		for c in node.children:
-			self.traverseNode(c)
+			actions.append((None, c))
 			if c.type == 'keyword' and c.value == 'import' and not referenceKindAdded:
-				self.referenceKindStack.append(ReferenceKindInfo(srctrl.REFERENCE_IMPORT, node))
+				actions.append((self.beginVisitImportFromTargets, node))
 				referenceKindAdded = True
 
 		if referenceKindAdded:
-			self.referenceKindStack.pop()
+			actions.append((self.endVisitImportFromTargets, node))
+		return actions
 
 
 	def traverseDottedAsNameOrImportAsName(self, node):
-		if node is None:
-			return
-
-		referenceKindRemoved = False
-		previousReferenceKind = None
+		actions = []
+		aliasFound = False
 
 		for c in node.children:
-			self.traverseNode(c)
-			if c.type == 'keyword' and c.value == 'as' and not referenceKindRemoved and len(self.referenceKindStack) > 0:
-				previousReferenceKind = self.referenceKindStack[-1]
-				self.referenceKindStack.pop()
-				referenceKindRemoved = True
+			actions.append((None, c))
+			if c.type == 'keyword' and c.value == 'as' and not aliasFound:
+				actions.append((self.beginVisitImportAlias, node))
+				aliasFound = True
 
-		if referenceKindRemoved:
-			self.referenceKindStack.append(previousReferenceKind)
+		if aliasFound:
+			actions.append((self.endVisitImportAlias, node))
+		return actions
 
 
-#----------------
-
 	def beginVisitClassdef(self, node):
 		nameNode = node.name
 
@@ -300,6 +282,28 @@ class AstVisitor:
 				self.referenceKindStack.pop()
 
 
+	def beginVisitImportFromTargets(self, node):
+		self.referenceKindStack.append(ReferenceKindInfo(srctrl.REFERENCE_IMPORT, node))
+
+
+	def endVisitImportFromTargets(self, node):
+		self.referenceKindStack.pop()
+
+
+	def beginVisitImportAlias(self, node):
+		# the alias itself is not an import, so the current reference kind is suspended until the alias has been visited
+		if len(self.referenceKindStack) > 0:
+			self.suspendedReferenceKindStack.append(self.referenceKindStack.pop())
+		else:
+			self.suspendedReferenceKindStack.append(None)
+
+
+	def endVisitImportAlias(self, node):
+		previousReferenceKind = self.suspendedReferenceKindStack.pop()
+		if previousReferenceKind is not None:
+			self.referenceKindStack.append(previousReferenceKind)
+
+
 	def beginVisitFuncdef(self, node):
 		nameNode = node.name
 
@@ -359,9 +363,7 @@ class AstVisitor:
 		if node.value in ['True', 'False', 'None']: # these are not parsed as "keywords" in Python 2
 			return
 
-		nextLeafNode = getNextLeaf(node)
-
-		if nextLeafNode is not None and nextLeafNode.type == "operator" and nextLeafNode.value == ".":
+		if self.nameTagIndex.isFollowedByDot(node):
 			symbolNameHierarchy = getNameHierarchyForUnsolvedSymbol()
 			symbolId = self.client.recordSymbol(symbolNameHierarchy)
 			self.client.recordQualifierLocation(symbolId, getSourceRangeOfNode(node))
@@ -376,14 +378,14 @@ class AstVisitor:
 				return
 
 		referenceKind = srctrl.REFERENCE_USAGE
-		if nextLeafNode is not None and nextLeafNode.type == "operator" and nextLeafNode.value == "(":
+		if self.nameTagIndex.isFollowedByOpeningParenthesis(node):
 			referenceKind = srctrl.REFERENCE_CALL
 
 		if node.is_definition():
-			namedDefinitionParentNode = getParentWithTypeInList(node, ['classdef', 'funcdef'])
+			namedDefinitionParentNode = self.scopeIndex.getParentScopeNode(node)
 			if namedDefinitionParentNode is not None:
 				if namedDefinitionParentNode.type in ['classdef']:
-					if getNamedParentNode(node) == namedDefinitionParentNode:
+					if self.scopeIndex.getNamedParentNode(node) == namedDefinitionParentNode:
 						# definition is not local to some other field instantiation but instead it is a static member variable
 						# node is the definition of the static member variable
 						symbolNameHierarchy = self.getNameHierarchyOfNode(node)
@@ -396,7 +398,7 @@ class AstVisitor:
 				elif namedDefinitionParentNode.type in ['funcdef']:
 					# definition may be a non-static member variable
 					if node.parent is not None and node.parent.type == 'trailer' and node.get_previous_sibling() is not None and node.get_previous_sibling().value == '.':
-						potentialSelfParamNode = getNamedParentNode(node)
+						potentialSelfParamNode = self.scopeIndex.getNamedParentNode(node)
 						if potentialSelfParamNode is not None and getFirstDirectChildWithType(potentialSelfParamNode, 'name').value == self.contextStack[-1].selfParamName:
 							# definition is a non-static member variable
 							symbolNameHierarchy = self.getNameHierarchyOfNode(node)
@@ -495,40 +497,28 @@ class AstVisitor:
 		if filePath is None:
 			return None
 
-		if filePath == _virtualFilePath:
-			return NameHierarchy(NameElement(os.path.splitext(_virtualFilePath)[0]), '.')
-
-		filePath = os.path.abspath(filePath)
-		# First remove the suffix.
-		for suffix in ['.py']:
-			if filePath.endswith(suffix):
-				filePath = filePath[:-len(suffix)]
-				break
+		if filePath in self.moduleNameHierarchyCache:
+			return self.moduleNameHierarchyCache[filePath]
 
-		for p in self.sysPath:
-			if filePath.startswith(p):
-				rest = filePath[len(p):]
-				if rest.startswith(os.path.sep):
-					# Remove a slash in cases it's still there.
-					rest = rest[1:]
-				if rest:
-					split = rest.split(os.path.sep)
-					for string in split:
-						if not string:
-							return None
-
-					if split[-1] == '__init__':
-						split = split[:-1]
-
-					nameHierarchy = None
-					for namePart in split:
-						if nameHierarchy is None:
-							nameHierarchy = NameHierarchy(NameElement(namePart), '.')
-						else:
-							nameHierarchy.nameElements.append(NameElement(namePart))
-					return nameHierarchy
-
-		return None
+		if filePath == _virtualFilePath:
+			nameHierarchy = NameHierarchy(NameElement(os.path.splitext(_virtualFilePath)[0]), '.')
+		else:
+			nameHierarchy = None
+			absoluteFilePath = os.path.abspath(filePath)
+			# First remove the suffix.
+			for suffix in ['.py']:
+				if absoluteFilePath.endswith(suffix):
+					absoluteFilePath = absoluteFilePath[:-len(suffix)]
+					break
+
+			split = self.modulePathIndex.getModuleNames(absoluteFilePath)
+			if split is not None:
+				if split[-1] == '__init__':
+					split = split[:-1]
+				nameHierarchy = getNameHierarchyFromNames(split, '.')
+
+		self.moduleNameHierarchyCache[filePath] = nameHierarchy
+		return nameHierarchy
 
 
 	def getNameHierarchyOfNode(self, node):
@@ -543,10 +533,10 @@ class AstVisitor:
 		if nameNode is None:
 			return None
 
-		parentNode = getParentWithTypeInList(nameNode.parent, ['classdef', 'funcdef'])
+		parentNode = self.scopeIndex.getParentScopeNode(nameNode.parent)
 
 		if self.contextStack[-1].contextType == ContextType.METHOD:
-			potentialSelfNode = getNamedParentNode(node)
+			potentialSelfNode = self.scopeIndex.getNamedParentNode(node)
 			if potentialSelfNode is not None:
 				potentialSelfNameNode = getFirstDirectChildWithType(potentialSelfNode, 'name')
 				if potentialSelfNameNode is not None and potentialSelfNameNode.value == self.contextStack[-1].selfParamName:
@@ -558,14 +548,12 @@ class AstVisitor:
 			parentNodeNameHierarchy = self.getNameHierarchyOfNode(parentNode)
 			if parentNodeNameHierarchy is None:
 				return None
-			parentNodeNameHierarchy.nameElements.append(nameElement)
-			return parentNodeNameHierarchy
+			return parentNodeNameHierarchy.copyAndAppend(nameElement)
 
 		nameHierarchy = self.getNameHierarchyFromModuleFilePath(self.sourceFilePath)
 		if nameHierarchy is None:
 			return None
-		nameHierarchy.nameElements.append(nameElement)
-		return nameHierarchy
+		return nameHierarchy.copyAndAppend(nameElement)
 
 		return None
 
@@ -574,16 +562,16 @@ class VerboseAstVisitor(AstVisitor):
 
 	def __init__(self, client, sourceFilePath, sourceFileContent = None, sysPath = None):
 		AstVisitor.__init__(self, client, sourceFilePath, sourceFileContent, sysPath)
-		self.indentationLevel = 0
 		self.indentationToken = '| '
 
 
 	def traverseNode(self, node):
-		if node is None:
-			return
+		AstVisitor.traverseNode(self, node, self.printNode)
+
 
+	def printNode(self, node, depth):
 		currentString = ''
-		for i in range(0, self.indentationLevel):
+		for i in range(0, depth):
 			currentString += self.indentationToken
 
 		currentString += node.type
@@ -595,10 +583,6 @@ class VerboseAstVisitor(AstVisitor):
 
 		print('AST: ' + currentString)
 
-		self.indentationLevel += 1
-		AstVisitor.traverseNode(self, node)
-		self.indentationLevel -= 1
-
 
 def getNameHierarchyForUnsolvedSymbol():
 	return NameHierarchy(NameElement(NameHierarchy.unsolvedSymbolName), '')
@@ -647,17 +631,6 @@ def getParentWithType(node, type):
 	return getParentWithType(parentNode, type)
 
 
-def getParentWithTypeInList(node, typeList):
-	if node == None:
-		return None
-	parentNode = node.parent
-	if parentNode == None:
-		return None
-	if parentNode.type in typeList:
-		return parentNode
-	return getParentWithTypeInList(parentNode, typeList)
-
-
 def getFirstDirectChildWithType(node, type):
 	for c in node.children:
 		if c.type == type:
@@ -687,11 +660,3 @@ def getNext(node):
 
 	return None
 
-
-
-def getNextLeaf(node):
-	nextNode = getNext(node)
-	while nextNode is not None and hasattr(nextNode, 'children'):
-		nextNode = getNext(nextNode)
-	return nextNode
-
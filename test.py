@@ -1,11 +1,34 @@
+import argparse
 import indexer
+import json
 import multiprocessing
 import os
+import parso
+import run
 import sourcetraildb as srctrl
 import sys
+import tempfile
 import unittest
 
 
+_temporaryCacheDirectory = None
+_cacheDirectoryPaths = None
+
+
+def setUpModule():
+	# keep the environment and builtins caches of the tests out of the user's jedi cache
+	global _temporaryCacheDirectory, _cacheDirectoryPaths
+	_temporaryCacheDirectory = tempfile.TemporaryDirectory()
+	_cacheDirectoryPaths = (indexer._cacheDirectoryPath, indexer._environmentCacheFilePath)
+	indexer._cacheDirectoryPath = os.path.join(_temporaryCacheDirectory.name, 'SourcetrailPythonIndexer')
+	indexer._environmentCacheFilePath = os.path.join(indexer._cacheDirectoryPath, 'environments.json')
+
+
+def tearDownModule():
+	indexer._cacheDirectoryPath, indexer._environmentCacheFilePath = _cacheDirectoryPaths
+	_temporaryCacheDirectory.cleanup()
+
+
 class TestPythonIndexer(unittest.TestCase):
 
 # Test Recording Symbols
@@ -338,6 +361,77 @@ class TestPythonIndexer(unittest.TestCase):
 		self.assertTrue('OVERRIDE: virtual_file.Baz.my_method -> virtual_file.Foo.my_method at [2:6|2:14]' in client.references)
 
 
+	def test_indexer_looks_up_base_classes_and_members_once_per_file(self):
+		class CountingAstVisitor(indexer.AstVisitor):
+			overrideLookupCount = 0
+			def inferOverride(self, *args):
+				self.overrideLookupCount += 1
+				return super().inferOverride(*args)
+
+		sourceCode = (
+			'class Foo:\n'
+			'	def a(self):\n'
+			'		pass\n'
+			'	def b(self):\n'
+			'		pass\n'
+		)
+		for i in range(5):
+			sourceCode += (
+				'class Bar' + str(i) + '(Foo):\n'
+				'	def a(self):\n'
+				'		pass\n'
+				'	def b(self):\n'
+				'		pass\n'
+			)
+		client = TestAstVisitorClient()
+		astVisitor = CountingAstVisitor(client, indexer.getEnvironment(None), indexer._virtualFilePath, sourceCode)
+		astVisitor.traverseNode(astVisitor.getModuleNode())
+		client.updateReadableOutput()
+
+		self.assertTrue('OVERRIDE: virtual_file.Bar4.b -> virtual_file.Foo.b at [4:6|4:6]' in client.references)
+		# Foo: its bases and "a" and "b" of object, each Bar: its bases, all Bars: "a" and "b" of Foo (instead of 2 lookups
+		# for each of the 12 methods)
+		self.assertEqual(3 + 5 + 2, astVisitor.overrideLookupCount)
+
+
+	def test_indexer_records_override_edge_for_method_of_last_class_in_file_with_many_methods(self):
+		# the inference state is shared by all names of a file, so its limits must not run out before the last class
+		sourceCode = (
+			'def make_base():\n'
+			'	class Base:\n'
+			'		def my_method(self):\n'
+			'			return make_base()\n'
+			'	return Base\n'
+		)
+		for i in range(60):
+			sourceCode += (
+				'class Foo' + str(i) + '(make_base()):\n'
+				'	def my_method(self):\n'
+				'		return make_base()().my_method()\n'
+			)
+		client = self.indexSourceCode(sourceCode)
+		self.assertTrue('OVERRIDE: virtual_file.Foo59.my_method -> virtual_file.make_base.Base.my_method at [3:7|3:15]' in client.references)
+
+
+	def test_indexer_records_override_edges_for_methods_of_classes_sharing_a_parent(self):
+		client = self.indexSourceCode(
+			'class Foo:\n'
+			'	def my_method(self):\n'
+			'		pass\n'
+			'class Bar(Foo):\n'
+			'	def my_method(self):\n'
+			'		pass\n'
+			'	def other_method(self):\n'
+			'		pass\n'
+			'class Baz(Foo):\n'
+			'	def my_method(self):\n'
+			'		pass\n'
+		)
+		self.assertTrue('OVERRIDE: virtual_file.Bar.my_method -> virtual_file.Foo.my_method at [2:6|2:14]' in client.references)
+		self.assertTrue('OVERRIDE: virtual_file.Baz.my_method -> virtual_file.Foo.my_method at [2:6|2:14]' in client.references)
+		self.assertEqual(len([r for r in client.references if r.startswith('OVERRIDE: ')]), 2)
+
+
 	def test_indexer_records_instantiation_of_custom_class(self):
 		client = self.indexSourceCode(
 			'class Bar:\n'
@@ -385,6 +479,19 @@ class TestPythonIndexer(unittest.TestCase):
 		self.assertTrue('CALL: virtual_file -> builtins.str.islower at [1:21|1:27]' in client.references)
 
 
+	def test_indexer_records_call_to_builtin_function_that_is_not_shadowed(self):
+		client = self.indexSourceCode(
+			'def foo(x):\n'
+			'	return len(x)\n'
+			'def max(x):\n'
+			'	return len(x)\n'
+			'max([foo])\n'
+		)
+		self.assertTrue('CALL: virtual_file.foo -> builtins.len at [2:9|2:11]' in client.references)
+		self.assertTrue('CALL: virtual_file -> virtual_file.max at [5:1|5:3]' in client.references)
+		self.assertTrue('CALL: virtual_file -> builtins.max at [5:1|5:3]' not in client.references)
+
+
 	def test_indexer_records_call_to_environment_function(self):
 		client = self.indexSourceCode(
 			'import sys\n'
@@ -403,6 +510,22 @@ class TestPythonIndexer(unittest.TestCase):
 		self.assertTrue('CALL: virtual_file -> virtual_file.main at [4:1|4:4]' in client.references)
 
 
+	def test_indexer_records_repeated_calls_to_method_of_nested_class(self):
+		client = self.indexSourceCode(
+			'class Foo:\n'
+			'	class Bar:\n'
+			'		def baz(self):\n'
+			'			pass\n'
+			'Foo.Bar().baz()\n'
+			'Foo.Bar().baz()\n'
+		)
+		self.assertTrue('CLASS: virtual_file.Foo.Bar at [2:8|2:10] with scope [2:2|5:0]' in client.symbols)
+		self.assertTrue('CALL: virtual_file -> virtual_file.Foo.Bar.__init__ at [5:5|5:7]' in client.references)
+		self.assertTrue('CALL: virtual_file -> virtual_file.Foo.Bar.__init__ at [6:5|6:7]' in client.references)
+		self.assertTrue('CALL: virtual_file -> virtual_file.Foo.Bar.baz at [5:11|5:13]' in client.references)
+		self.assertTrue('CALL: virtual_file -> virtual_file.Foo.Bar.baz at [6:11|6:13]' in client.references)
+
+
 	def test_indexer_does_not_record_static_field_initialization_as_usage(self):
 		client = self.indexSourceCode(
 			'class Foo:\n'
@@ -619,6 +742,422 @@ class TestPythonIndexer(unittest.TestCase):
 		self.assertTrue('ERROR: "Imported symbol named "this_is_not_a_real_symbol_2" has not been found." at [1:54|1:80]' in client.errors)
 
 
+# Test Name Hierarchies
+
+	def test_serialized_name_hierarchy_matches_json_encoder_output(self):
+		nameHierarchy = indexer.NameHierarchy(indexer.NameElement('f\u00f6\u00f6', 'pre "fix"', '\\post\tfix'), '.')
+		nameHierarchy = nameHierarchy.copyAndAppend(indexer.NameElement('bar'))
+		self.assertEqual(json.dumps(nameHierarchy, cls=indexer.NameHierarchyEncoder), nameHierarchy.serialize())
+
+		nameHierarchy = nameHierarchy.copyAndAppend(indexer.NameElement('baz', '', '()'))
+		self.assertEqual(json.dumps(nameHierarchy, cls=indexer.NameHierarchyEncoder), nameHierarchy.serialize())
+		self.assertEqual('pre "fix" f\u00f6\u00f6\\post\tfix.bar.baz()', nameHierarchy.getDisplayString())
+
+
+# Test Module Paths
+
+	def test_module_path_index_uses_first_directory_of_sys_path_that_contains_file(self):
+		modulePathIndex = indexer.ModulePathIndex([
+			os.path.join(os.sep, 'foo', 'bar'),
+			os.path.join(os.sep, 'foo'),
+			os.path.join(os.sep, 'foo', 'bar', 'baz')
+		])
+		self.assertEqual(modulePathIndex.getModuleNames(os.path.join(os.sep, 'foo', 'bar', 'baz', 'qux')), ['baz', 'qux'])
+		self.assertEqual(modulePathIndex.getModuleNames(os.path.join(os.sep, 'foo', 'barbaz', 'qux')), ['barbaz', 'qux'])
+		self.assertEqual(modulePathIndex.getModuleNames(os.path.join(os.sep, 'foo')), None)
+		self.assertEqual(modulePathIndex.getModuleNames(os.path.join(os.sep, 'qux')), None)
+
+
+# Test Name Tags
+
+	def test_name_tags_match_classification_of_single_names(self):
+		moduleNode = parso.parse(
+			'from os import path as p\n'
+			'import a.b\n'
+			'@decorator(x)\n'
+			'def foo(bar):\n'
+			'	return bar.baz(qux[0]).quux(...).corge\n'
+		)
+		nameTagIndex = indexer.NameTagIndex(moduleNode)
+		calls = []
+		qualifiers = []
+		leaf = moduleNode.get_first_leaf()
+		while leaf is not None:
+			if leaf.type == 'name':
+				if nameTagIndex.isCall(leaf):
+					calls.append(leaf.value)
+				if nameTagIndex.isQualifier(leaf):
+					qualifiers.append(leaf.value)
+				self.assertEqual(indexer.getParentWithType(leaf, 'import_from') is not None, nameTagIndex.isInImportFrom(leaf))
+				self.assertEqual(indexer.getParentWithType(leaf, 'import_name') is not None, nameTagIndex.isInImportName(leaf))
+			leaf = leaf.get_next_leaf()
+		self.assertEqual(calls, ['baz', 'quux'])
+		self.assertEqual(qualifiers, ['a', 'bar'])
+
+
+# Test Recording Clients
+
+	def test_replaying_recorded_data_yields_same_data_as_indexing_directly(self):
+		sourceCode = (
+			'import sys\n'
+			'class Foo:\n'
+			'	def bar(self, baz):\n'
+			'		self.x = baz\n'
+			'		return sys.getrecursionlimit()\n'
+			'Foo().bar(unknown)\n'
+		)
+		directClient = self.indexSourceCode(sourceCode)
+
+		recordingClient = indexer.RecordingAstVisitorClient()
+		indexer.indexSourceCode(sourceCode, os.getcwd(), recordingClient, False)
+		replayClient = TestAstVisitorClient()
+		indexer.replayRecords(recordingClient.records, replayClient)
+		replayClient.updateReadableOutput()
+
+		self.assertEqual(directClient.symbols, replayClient.symbols)
+		self.assertEqual(directClient.localSymbols, replayClient.localSymbols)
+		self.assertEqual(directClient.references, replayClient.references)
+		self.assertEqual(directClient.qualifiers, replayClient.qualifiers)
+		self.assertEqual(directClient.errors, replayClient.errors)
+
+
+	def test_buffered_client_forwards_same_data_as_indexing_directly(self):
+		sourceCode = (
+			'import sys\n'
+			'class Foo:\n'
+			'	def bar(self, baz):\n'
+			'		self.x = baz\n'
+			'		self.x = self.x + baz\n'
+			'		return sys.getrecursionlimit()\n'
+			'Foo().bar(unknown)\n'
+			'Foo().bar(unknown)\n'
+		)
+		directClient = self.indexSourceCode(sourceCode)
+
+		targetClient = TestAstVisitorClient()
+		bufferedClient = indexer.BufferedAstVisitorClient(targetClient)
+		indexer.indexSourceCode(sourceCode, os.getcwd(), bufferedClient, False)
+		bufferedClient.flush()
+		targetClient.updateReadableOutput()
+
+		self.assertEqual(set(directClient.symbols), set(targetClient.symbols))
+		self.assertEqual(set(directClient.localSymbols), set(targetClient.localSymbols))
+		self.assertEqual(set(directClient.references), set(targetClient.references))
+		self.assertEqual(set(directClient.qualifiers), set(targetClient.qualifiers))
+		self.assertEqual(set(directClient.errors), set(targetClient.errors))
+		self.assertGreater(bufferedClient.getSavedCallCount(), 0)
+
+
+# Test Environments
+
+	def test_environment_loaded_from_cache_matches_created_environment(self):
+		executablePath = indexer.getExecutablePathOfEnvironment(None)
+		if executablePath is None:
+			self.skipTest('executable of default environment cannot be determined')
+
+		createdEnvironment = indexer.createEnvironment(None)
+		indexer.storeEnvironmentInCache(executablePath, createdEnvironment)
+		cachedEnvironment = indexer.loadEnvironmentFromCache(executablePath)
+
+		self.assertIsNotNone(cachedEnvironment)
+		self.assertEqual(createdEnvironment.path, cachedEnvironment.path)
+		self.assertEqual(createdEnvironment.version_info, cachedEnvironment.version_info)
+		self.assertEqual(createdEnvironment.get_sys_path(), cachedEnvironment.get_sys_path())
+
+
+	def test_indexer_uses_provided_project_for_inference(self):
+		environment = indexer.getEnvironment(None)
+		project = indexer.jedi.api.project.Project(os.getcwd(), environment_path = environment.path)
+		astVisitor = indexer.AstVisitor(TestAstVisitorClient(), environment, indexer._virtualFilePath, 'import os\n', project = project)
+		astVisitor.traverseNode(astVisitor.getModuleNode())
+
+		self.assertIs(astVisitor.getScript(indexer._virtualFilePath)._inference_state.project, project)
+
+
+# Test Parse Cache
+
+	def test_pruning_parse_cache_removes_least_recently_used_files(self):
+		cacheDirectoryPath = indexer.jedi.settings.cache_directory
+		with tempfile.TemporaryDirectory() as temporaryDirectoryPath:
+			try:
+				indexer.configureParseCache(temporaryDirectoryPath)
+				parseCacheDirectoryPath = indexer.getParseCacheDirectoryPath()
+				for i, fileName in enumerate(['b.pkl', 'a.pkl', 'c.pkl']):
+					cacheFilePath = os.path.join(parseCacheDirectoryPath, fileName)
+					with open(cacheFilePath, 'wb') as output:
+						output.write(b'0' * 100)
+					os.utime(cacheFilePath, (1000 + i, 1000))
+
+				self.assertEqual(indexer.pruneParseCache(250), 1)
+				self.assertEqual(sorted(os.listdir(parseCacheDirectoryPath)), ['a.pkl', 'c.pkl'])
+			finally:
+				indexer.jedi.settings.cache_directory = cacheDirectoryPath
+
+
+	def test_parse_cache_files_are_marked_as_used_again_by_later_runs(self):
+		cacheDirectoryPath = indexer.jedi.settings.cache_directory
+		with tempfile.TemporaryDirectory() as temporaryDirectoryPath:
+			try:
+				indexer.configureParseCache(os.path.join(temporaryDirectoryPath, 'cache'))
+				with open(os.path.join(temporaryDirectoryPath, 'cached_module.py'), 'w') as output:
+					output.write('foo = 1\n')
+				self.indexSourceCode('import cached_module\ncached_module.foo\n', sysPath = [temporaryDirectoryPath])
+				indexer.markUsedParseCacheFiles()
+
+				parseCacheDirectoryPath = indexer.getParseCacheDirectoryPath()
+				cacheFilePaths = [os.path.join(parseCacheDirectoryPath, fileName) for fileName in os.listdir(parseCacheDirectoryPath)]
+				self.assertGreater(len(cacheFilePaths), 0)
+				for cacheFilePath in cacheFilePaths:
+					os.utime(cacheFilePath, (1000, os.stat(cacheFilePath).st_mtime))
+
+				# the module is still in use by a later run of the same process
+				indexer.resetUsedParseCacheFiles()
+				indexer.markUsedParseCacheFiles()
+				for cacheFilePath in cacheFilePaths:
+					self.assertGreater(os.stat(cacheFilePath).st_atime, 1000)
+			finally:
+				indexer.jedi.settings.cache_directory = cacheDirectoryPath
+
+
+# Test Import Cache
+
+	def test_indexer_records_same_data_for_imports_resolved_from_import_cache(self):
+		sourceCode = (
+			'import os.path as osp\n'
+			'from xml.dom import minidom\n'
+			'import this_module_does_not_exist\n'
+		)
+		client = self.indexSourceCode(sourceCode)
+		hitCount = indexer._importCache.hitCount
+		cachedClient = self.indexSourceCode(sourceCode)
+
+		self.assertGreater(indexer._importCache.hitCount, hitCount)
+		self.assertEqual(client.symbols, cachedClient.symbols)
+		self.assertEqual(client.references, cachedClient.references)
+		self.assertEqual(client.qualifiers, cachedClient.qualifiers)
+		self.assertEqual(client.errors, cachedClient.errors)
+
+
+	def test_import_cache_does_not_store_unresolved_imports(self):
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceCode = 'import module_added_later\n'
+			client = self.indexSourceCode(sourceCode, sysPath = [directoryPath])
+			self.assertTrue('USAGE: virtual_file -> unsolved symbol at [1:8|1:25]' in client.references)
+			self.assertFalse(any(len(modules) == 0 for modules in indexer._importCache.entries.values()))
+
+			# an unresolved import stored by an earlier run is not loaded from the persisted cache
+			key = ['key_of_unresolved_import']
+			indexer.addImportCacheEntries([[key, []]])
+			self.assertIsNone(indexer._importCache.get(tuple(key)))
+
+			# keep the modification time of the directory, so only a cached unresolved import would prevent resolving it
+			directoryTimes = (os.stat(directoryPath).st_atime_ns, os.stat(directoryPath).st_mtime_ns)
+			with open(os.path.join(directoryPath, 'module_added_later.py'), 'w') as moduleFile:
+				moduleFile.write('foo = 1\n')
+			os.utime(directoryPath, ns = directoryTimes)
+
+			client = self.indexSourceCode(sourceCode, sysPath = [directoryPath])
+			self.assertTrue('IMPORT: virtual_file -> module_added_later at [1:8|1:25]' in client.references)
+
+
+# Test Inference Budget
+
+	def test_indexer_records_name_as_unsolved_if_inference_time_budget_is_exceeded(self):
+		if not hasattr(indexer.signal, 'setitimer'):
+			self.skipTest('inference of a single name cannot be interrupted on this platform')
+		sourceCode = (
+			'import os\n'
+			'def foo():\n'
+			'	pass\n'
+			'foo()\n'
+			'os.getcwd()\n'
+		)
+		client = TestAstVisitorClient()
+		indexer.indexSourceCode(sourceCode, os.getcwd(), client, False, nameInferenceBudget = 0.000001)
+		client.updateReadableOutput()
+		self.assertTrue('USAGE: virtual_file -> unsolved symbol at [4:1|4:3]' in client.references)
+		self.assertTrue('USAGE: virtual_file -> unsolved symbol at [5:4|5:9]' in client.references)
+
+		# the indexer is still able to resolve names after inference has been interrupted
+		client = self.indexSourceCode(sourceCode)
+		self.assertTrue('CALL: virtual_file -> virtual_file.foo at [4:1|4:3]' in client.references)
+		self.assertTrue('CALL: virtual_file -> os.getcwd at [5:4|5:9]' in client.references)
+
+
+	def test_indexer_finishes_override_and_builtins_lookups_if_inference_time_budget_is_exceeded(self):
+		if not hasattr(indexer.signal, 'setitimer'):
+			self.skipTest('inference of a single name cannot be interrupted on this platform')
+		sourceCode = (
+			'import os\n'
+			'class Foo(os.PathLike):\n'
+			'	def my_method(self):\n'
+			'		pass\n'
+			'class Bar(Foo):\n'
+			'	def my_method(self):\n'
+			'		return len([])\n'
+		)
+		builtinsIndices = dict(indexer._builtinsIndices)
+		cacheDirectoryPath = indexer._cacheDirectoryPath
+		with tempfile.TemporaryDirectory() as temporaryDirectoryPath:
+			try:
+				indexer._builtinsIndices.clear()
+				indexer._cacheDirectoryPath = temporaryDirectoryPath
+				client = TestAstVisitorClient()
+				indexer.indexSourceCode(sourceCode, os.getcwd(), client, False, nameInferenceBudget = 0.000001)
+				# a builtins index that misses names is not stored
+				self.assertEqual([], [n for n in os.listdir(temporaryDirectoryPath) if n.startswith('builtins-')])
+				self.assertEqual({}, indexer._builtinsIndices)
+			finally:
+				indexer._builtinsIndices.update(builtinsIndices)
+				indexer._cacheDirectoryPath = cacheDirectoryPath
+		client.updateReadableOutput()
+		self.assertTrue('INDEXED FILE: virtual_file.py' in client.symbols)
+		self.assertTrue('FUNCTION: unsolved symbol at [6:6|6:14] with scope [6:2|8:0]' in client.symbols)
+		self.assertFalse(any(reference.startswith('OVERRIDE: ') for reference in client.references))
+
+
+	def test_inference_budget_defers_interruption_while_parse_cache_is_written(self):
+		budget = indexer.InferenceBudget(0.000001, None)
+		budget.isInferring = True
+		handleTimerSignal = lambda: budget.handleTimerSignal(indexer.signal.SIGALRM, sys._getframe())
+		parseCacheGlobals = { '__name__': 'parso.cache', 'handleTimerSignal': handleTimerSignal }
+		exec('def _save_to_file_system():\n	handleTimerSignal()\n_save_to_file_system()\n', parseCacheGlobals)
+		self.assertRaises(indexer.InferenceTimeout, handleTimerSignal)
+
+
+# Test Hybrid Mode
+
+	def test_indexer_records_same_data_in_hybrid_mode_as_in_deep_mode(self):
+		sourceCode = (
+			'import os\n'
+			'x = 1\n'
+			'def foo(bar, baz=x):\n'
+			'	global x\n'
+			'	x = bar\n'
+			'	qux = [bar for bar in baz]\n'
+			'	for i in range(bar):\n'
+			'		qux.append(i)\n'
+			'	with open(os.getcwd()) as f:\n'
+			'		qux = f\n'
+			'	def os():\n'
+			'		return qux\n'
+			'	return lambda y: y + qux + os()\n'
+		)
+		client = self.indexSourceCode(sourceCode)
+		indexer.takeHybridStatistics()
+		hybridClient = self.indexSourceCode(sourceCode, hybrid = True)
+		(localNameCount, inferredNameCount) = indexer.takeHybridStatistics()
+
+		self.assertGreater(localNameCount, 0)
+		self.assertGreater(inferredNameCount, 0)
+		self.assertEqual(sorted(set(client.symbols)), sorted(set(hybridClient.symbols)))
+		self.assertEqual(sorted(set(client.localSymbols)), sorted(set(hybridClient.localSymbols)))
+		self.assertEqual(sorted(set(client.references)), sorted(set(hybridClient.references)))
+		self.assertEqual(sorted(set(client.qualifiers)), sorted(set(hybridClient.qualifiers)))
+
+
+# Test Incremental Indexing
+
+	def test_incremental_indexing_skips_unchanged_files(self):
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceFilePaths = [
+				self.writeSourceFile(directoryPath, 'foo.py', 'import bar\n'),
+				self.writeSourceFile(directoryPath, 'bar.py', 'x = 1\n')
+			]
+			manifest = self.indexProjectFiles(sourceFilePaths, directoryPath)
+
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, sourceFilePaths), [])
+
+
+	def test_incremental_indexing_reindexes_dependent_of_changed_module(self):
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceFilePath = self.writeSourceFile(directoryPath, 'foo.py', 'import bar\n')
+			dependencyPath = self.writeSourceFile(directoryPath, 'bar.py', 'x = 1\n')
+			manifest = self.indexProjectFiles([sourceFilePath], directoryPath)
+			self.assertEqual(manifest['files'][sourceFilePath]['dependencies'], [dependencyPath])
+
+			self.writeSourceFile(directoryPath, 'bar.py', 'x = 1\ny = 2\n')
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [sourceFilePath])
+
+
+	def test_incremental_indexing_reindexes_file_that_failed_to_index(self):
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceFilePath = self.writeSourceFile(directoryPath, 'foo.py', 'x = 1\n')
+			manifest = self.indexProjectFiles([sourceFilePath], directoryPath)
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [])
+
+			missingFilePath = os.path.join(directoryPath, 'missing.py')
+			(indexedFiles, failedFilePaths) = run.indexSourceFilesSequentially(
+				[missingFilePath], None, directoryPath, TestAstVisitorClient(), self.getIndexProjectArguments()
+			)
+			self.assertEqual(indexedFiles, [])
+			self.assertEqual(failedFilePaths, [missingFilePath])
+
+			# a file that failed in a later run keeps no entry of an earlier run
+			run.updateManifest(manifest, [], [sourceFilePath], {}, self.getIndexingIdentity())
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [sourceFilePath])
+
+
+	def test_index_project_discards_data_of_file_that_failed_to_index(self):
+		def beginVisitImportName(self, node):
+			raise RuntimeError('failed to index import')
+
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceFilePath = self.writeSourceFile(directoryPath, 'foo.py', 'x = 1\nimport bar\n')
+			client = TestAstVisitorClient()
+			originalBeginVisitImportName = indexer.AstVisitor.beginVisitImportName
+			indexer.AstVisitor.beginVisitImportName = beginVisitImportName
+			try:
+				(indexedFiles, failedFilePaths) = run.indexSourceFilesSequentially(
+					[sourceFilePath], None, directoryPath, client, self.getIndexProjectArguments()
+				)
+			finally:
+				indexer.AstVisitor.beginVisitImportName = originalBeginVisitImportName
+			client.updateReadableOutput()
+
+			self.assertEqual(failedFilePaths, [sourceFilePath])
+			self.assertEqual(client.symbols, [])
+			self.assertEqual(client.localSymbols, [])
+
+
+	def test_incremental_indexing_reindexes_file_if_added_module_resolves_import(self):
+		with tempfile.TemporaryDirectory() as directoryPath:
+			sourceFilePath = self.writeSourceFile(directoryPath, 'foo.py', 'import bar\nfrom . import baz\n')
+			manifest = self.indexProjectFiles([sourceFilePath], directoryPath)
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [])
+
+			self.writeSourceFile(directoryPath, 'bar.py', 'x = 1\n')
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [sourceFilePath])
+
+			os.remove(os.path.join(directoryPath, 'bar.py'))
+			os.mkdir(os.path.join(directoryPath, 'baz'))
+			self.assertEqual(self.getSourceFilePathsToReindex(manifest, [sourceFilePath]), [sourceFilePath])
+
+
+# Test Serve
+
+	def test_serve_only_removes_stale_sockets(self):
+		if not hasattr(run.socket, 'AF_UNIX'):
+			self.skipTest('Unix domain sockets are not supported on this platform')
+
+		with tempfile.TemporaryDirectory() as directoryPath:
+			filePath = self.writeSourceFile(directoryPath, 'foo.py', 'x = 1\n')
+			self.assertFalse(run.removeStaleSocket(filePath))
+			self.assertTrue(os.path.exists(filePath))
+
+			socketPath = os.path.join(directoryPath, 'socket')
+			with run.socket.socket(run.socket.AF_UNIX, run.socket.SOCK_STREAM) as serverSocket:
+				serverSocket.bind(socketPath)
+				serverSocket.listen(1)
+				self.assertFalse(run.removeStaleSocket(socketPath))
+				self.assertTrue(os.path.exists(socketPath))
+
+			# the socket file is left behind once the server that created it stopped listening
+			self.assertTrue(run.removeStaleSocket(socketPath))
+			self.assertFalse(os.path.exists(socketPath))
+			self.assertTrue(run.removeStaleSocket(socketPath))
+
+
 # Test GitHub Issues
 
 	def test_issue_6(self): # Member variable has wrong name qualifiers if initialized from function parameter
@@ -759,7 +1298,7 @@ class TestPythonIndexer(unittest.TestCase):
 
 # Utility Functions
 
-	def indexSourceCode(self, sourceCode, environmentPath = None, sysPath = None, verbose = False):
+	def indexSourceCode(self, sourceCode, environmentPath = None, sysPath = None, verbose = False, hybrid = False):
 		workingDirectory = os.getcwd()
 		astVisitorClient = TestAstVisitorClient()
 
@@ -769,13 +1308,48 @@ class TestPythonIndexer(unittest.TestCase):
 			astVisitorClient,
 			verbose,
 			environmentPath,
-			sysPath
+			sysPath,
+			hybrid = hybrid
 		)
 
 		astVisitorClient.updateReadableOutput()
 		return astVisitorClient
 
 
+	def writeSourceFile(self, directoryPath, fileName, sourceCode):
+		sourceFilePath = os.path.join(directoryPath, fileName)
+		with open(sourceFilePath, 'w') as output:
+			output.write(sourceCode)
+		return sourceFilePath
+
+
+	def getIndexProjectArguments(self):
+		return argparse.Namespace(
+			shallow = False, hybrid = False, verbose = False, definition_cache_size = indexer._defaultDefinitionCacheSize,
+			name_inference_budget = None, file_inference_budget = None
+		)
+
+
+	def getIndexingIdentity(self):
+		return run.getIndexingIdentity(None, False, False)
+
+
+	def indexProjectFiles(self, sourceFilePaths, workingDirectory):
+		manifest = { 'files': {}, 'modules': {}, 'dependents': {} }
+		(indexedFiles, failedFilePaths) = run.indexSourceFilesSequentially(
+			sourceFilePaths, None, workingDirectory, TestAstVisitorClient(), self.getIndexProjectArguments()
+		)
+		self.assertEqual(failedFilePaths, [])
+		contentHashes = dict((p, run.getContentHash(p)) for p in sourceFilePaths)
+		run.updateManifest(manifest, indexedFiles, failedFilePaths, contentHashes, self.getIndexingIdentity())
+		return manifest
+
+
+	def getSourceFilePathsToReindex(self, manifest, sourceFilePaths):
+		contentHashes = dict((p, run.getContentHash(p)) for p in sourceFilePaths)
+		return run.getSourceFilePathsToReindex(manifest, sourceFilePaths, contentHashes, self.getIndexingIdentity())
+
+
 class TestAstVisitorClient():
 
 	def __init__(self):
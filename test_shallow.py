@@ -362,6 +362,19 @@ class TestPythonIndexer(unittest.TestCase):
 		self.assertTrue('ATOMIC SOURCE RANGE: [1:7|3:3]' in client.atomicSourceRanges)
 
 
+# Test Deeply Nested Code
+
+	def test_indexer_records_call_in_expression_nested_deeper_than_recursion_limit(self):
+		nestingDepth = sys.getrecursionlimit() + 100
+		client = self.indexSourceCode(
+			'def main():\n'
+			'	pass\n'
+			'\n'
+			'foo = ' + '-' * nestingDepth + 'main()\n'
+		)
+		self.assertTrue('CALL: virtual_file -> unsolved symbol at [4:' + str(nestingDepth + 7) + '|4:' + str(nestingDepth + 10) + ']' in client.references)
+
+
 # Test Recording Errors
 
 	def test_indexer_records_syntax_error(self):